@@ -0,0 +1,138 @@
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional
+
+from cache import LRUCache
+from retriever import tokenize
+
+# Words that do not change what is being asked ("what is the deadline" vs
+# "what's the deadline?"); negations are deliberately not listed
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "in", "on", "for", "to",
+    "what", "whats", "s", "please", "can", "could", "you", "me", "tell", "do", "does",
+    "this", "that", "it", "pdf", "document",
+}
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+def _vector(query: str) -> Counter:
+    terms = [term for term in tokenize(query) if term not in STOPWORDS]
+    return Counter(terms or tokenize(query))
+
+def _cosine(a: Counter, b: Counter) -> float:
+    dot = sum(count * b.get(term, 0) for term, count in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+def fingerprint(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class AnswerCache:
+    """
+    Cache of chat answers per document.
+
+    Answers are keyed by (document hash, normalized query) and, when
+    `use_context` is set, a fingerprint of the retrieved context, so a hit
+    also requires the same passages. Besides exact matches, a question whose
+    bag-of-words cosine similarity to a cached one reaches
+    `similarity_threshold` is answered from the cache (set it above 1 to
+    disable). Entries expire after `ttl` seconds and the least recently used
+    are evicted beyond `max_items`.
+    """
+
+    def __init__(self, max_items: int = None, ttl: float = None,
+                 similarity_threshold: float = None, use_context: bool = None,
+                 max_per_document: int = 500):
+        self.similarity_threshold = similarity_threshold or float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.9"))
+        if use_context is None:
+            use_context = os.getenv("ANSWER_CACHE_USE_CONTEXT", "true").lower() == "true"
+        self.use_context = use_context
+        self.max_per_document = max_per_document
+        self.answers = LRUCache(
+            max_items=max_items or int(os.getenv("ANSWER_CACHE_SIZE", "10000")),
+            ttl=ttl or float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+        )
+        # doc key -> {cache key: query vector}, scanned for near matches
+        self._vectors: "OrderedDict[str, OrderedDict[str, Counter]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def _scope(self, doc_id: str, context: Optional[str]) -> str:
+        if self.use_context and context is not None:
+            return f"{doc_id}:{fingerprint(context)}"
+        return doc_id
+
+    def lookup(self, doc_id: str, query: str, context: Optional[str] = None) -> Optional[str]:
+        scope = self._scope(doc_id, context)
+        normalized = normalize_query(query)
+        answer = self.answers.get(f"{scope}|{normalized}")
+        if answer is not None:
+            with self._lock:
+                self.exact_hits += 1
+            return answer
+
+        match = self._nearest(scope, _vector(normalized))
+        if match is not None:
+            answer = self.answers.get(match)
+            if answer is not None:
+                with self._lock:
+                    self.similar_hits += 1
+                return answer
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _nearest(self, scope: str, vector: Counter) -> Optional[str]:
+        if self.similarity_threshold > 1:
+            return None
+        with self._lock:
+            candidates = list(self._vectors.get(scope, {}).items())
+        best_key, best_score = None, 0.0
+        for key, cached_vector in candidates:
+            score = _cosine(vector, cached_vector)
+            if score > best_score:
+                best_key, best_score = key, score
+        if best_score >= self.similarity_threshold:
+            if best_key not in self.answers:
+                # Expired or evicted; forget its vector too
+                with self._lock:
+                    self._vectors.get(scope, {}).pop(best_key, None)
+                return None
+            return best_key
+        return None
+
+    def store(self, doc_id: str, query: str, answer: str, context: Optional[str] = None):
+        scope = self._scope(doc_id, context)
+        normalized = normalize_query(query)
+        key = f"{scope}|{normalized}"
+        self.answers.put(key, answer)
+        with self._lock:
+            vectors = self._vectors.setdefault(scope, OrderedDict())
+            self._vectors.move_to_end(scope)
+            vectors[key] = _vector(normalized)
+            vectors.move_to_end(key)
+            while len(vectors) > self.max_per_document:
+                vectors.popitem(last=False)
+            while len(self._vectors) > self.answers.max_items:
+                self._vectors.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "items": len(self.answers),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.answers.evictions,
+                "hit_ratio": round((self.exact_hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+            }
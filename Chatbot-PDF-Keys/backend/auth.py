@@ -11,6 +11,9 @@ API_KEY = os.getenv("API_KEY")
 if not API_KEY:
     raise ValueError("API_KEY environment variable is not set")
 
+# /metrics needs the key too (Prometheus can send the header) unless this is set
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() == "true"
+
 # Define API key header
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
@@ -26,4 +29,10 @@ async def get_api_key(api_key_header: str = Security(api_key_header)):
             status_code=403,
             detail="Invalid API Key",
         )
-    return api_key_header 
\ No newline at end of file
+    return api_key_header
+
+async def get_metrics_api_key(api_key_header: str = Security(api_key_header)):
+    """Validate the API key for /metrics unless METRICS_PUBLIC is true"""
+    if METRICS_PUBLIC:
+        return None
+    return await get_api_key(api_key_header)
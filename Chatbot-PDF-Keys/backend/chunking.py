@@ -0,0 +1,162 @@
+import os
+import re
+import threading
+import time
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Words, and each other non-space character (punctuation usually is a token)
+HEURISTIC_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Oversized text is split at the first of these that breaks it up:
+# paragraphs, lines, sentences, then words
+SEPARATORS = [re.compile(p) for p in (r"\n\s*\n", r"\n", r"(?<=[.!?;:])\s+", r"\s+")]
+
+class TokenCounter:
+    """
+    Counts LLM tokens.
+
+    With TOKENIZER_PATH pointing at a Hugging Face `tokenizer.json` (for
+    example the one published with the Ollama model's weights), counts are
+    exact and come from the Rust `tokenizers` library. Otherwise a heuristic
+    is used: about four characters per token, but never fewer tokens than
+    words and punctuation marks.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("TOKENIZER_PATH")
+        self.tokenizer = None
+        if self.path:
+            try:
+                from tokenizers import Tokenizer
+                self.tokenizer = Tokenizer.from_file(self.path)
+            except Exception as e:
+                print(f"Could not load tokenizer {self.path}, estimating token counts: {e}")
+        self.name = "tokenizer" if self.tokenizer is not None else "heuristic"
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        if self.tokenizer is not None:
+            return [len(encoding.ids) for encoding in self.tokenizer.encode_batch(texts, add_special_tokens=False)]
+        return [max(len(HEURISTIC_PATTERN.findall(text)), (len(text) + 3) // 4) for text in texts]
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The start of `text`, cut to at most `max_tokens` tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is not None:
+            encoding = self.tokenizer.encode(text, add_special_tokens=False)
+            if len(encoding.ids) <= max_tokens:
+                return text
+            return text[:encoding.offsets[max_tokens - 1][1]]
+        tokens = self.count(text)
+        while tokens > max_tokens:
+            text = text[:len(text) * max_tokens // tokens]
+            tokens = self.count(text)
+        return text
+
+_counter: Optional[TokenCounter] = None
+_counter_lock = threading.Lock()
+
+def get_token_counter() -> TokenCounter:
+    """Counter shared by the process; the tokenizer is loaded on first use"""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                _counter = TokenCounter()
+    return _counter
+
+class Chunk(NamedTuple):
+    text: str
+    page: int  # first page covered
+    end_page: int  # last page covered
+    tokens: int
+
+class PageChunker:
+    """
+    Packs pages into chunks of at most `max_tokens` tokens.
+
+    Chunks start at page boundaries and hold as many whole pages as fit, so
+    editing a page only changes the chunks that hold it. A page larger than
+    a chunk is split on its own, at paragraph breaks where possible, then
+    lines, sentences and words.
+    """
+
+    def __init__(self, max_tokens: int, counter: TokenCounter = None):
+        self.max_tokens = max(1, max_tokens)
+        self.counter = counter or get_token_counter()
+        self.seconds = 0.0  # time spent counting and splitting
+
+    def chunks(self, pages: Iterable[Tuple[int, str]]) -> Iterator[Chunk]:
+        """Chunk (page number, text) pairs as they arrive"""
+        current: List[Tuple[int, str]] = []
+        used = 0
+
+        def flush() -> List[Chunk]:
+            nonlocal current, used
+            ready = []
+            text = "".join(page for _, page in current)
+            if text.strip():
+                ready.append(Chunk(text, current[0][0], current[-1][0], used))
+            current = []
+            used = 0
+            return ready
+
+        for number, text in pages:
+            started = time.perf_counter()
+            page = text + "\n"
+            tokens = self.counter.count(page)
+            ready = []
+            if tokens > self.max_tokens:
+                ready += flush()
+                ready += [Chunk(piece, number, number, count) for piece, count in self._split(page)]
+            else:
+                if current and used + tokens > self.max_tokens:
+                    ready += flush()
+                current.append((number, page))
+                used += tokens
+            self.seconds += time.perf_counter() - started
+            yield from ready
+        yield from flush()
+
+    def _split(self, text: str, level: int = 0) -> List[Tuple[str, int]]:
+        """(piece, tokens) pairs covering `text`, each within the budget"""
+        if level == len(SEPARATORS):
+            # No separator left (e.g. one enormous word): cut by characters
+            step = max(1, len(text) * self.max_tokens // max(1, self.counter.count(text)))
+            pieces = [text[i:i + step] for i in range(0, len(text), step)]
+            return list(zip(pieces, self.counter.count_many(pieces)))
+
+        separator = SEPARATORS[level]
+        segments = []
+        start = 0
+        for match in separator.finditer(text):
+            if match.end() > start:
+                segments.append(text[start:match.end()])
+                start = match.end()
+        if start < len(text):
+            segments.append(text[start:])
+        if len(segments) <= 1:
+            return self._split(text, level + 1)
+
+        pieces = []
+        current = ""
+        used = 0
+        for segment, tokens in zip(segments, self.counter.count_many(segments)):
+            if tokens > self.max_tokens:
+                if current.strip():
+                    pieces.append((current, used))
+                current, used = "", 0
+                pieces += self._split(segment, level + 1)
+                continue
+            if current and used + tokens > self.max_tokens:
+                if current.strip():
+                    pieces.append((current, used))
+                current, used = "", 0
+            current += segment
+            used += tokens
+        if current.strip():
+            pieces.append((current, used))
+        return pieces
@@ -1,102 +1,824 @@
 import sqlite3
+import base64
+import functools
 import os
+import re
+import threading
+import time
+import json
+import zlib
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Tuple
 from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+
+from metrics import DB_QUERY_SECONDS, record
 
 # Load environment variables
 load_dotenv()
 
+BUSY_TIMEOUT_MS = 5000
+
+# Connection settings applied to every pooled connection
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",  # readers never block the writer
+    "PRAGMA synchronous=NORMAL",  # safe with WAL, avoids an fsync per commit
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA cache_size=-{int(os.getenv('SQLITE_CACHE_KB', '20000'))}",
+    f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_BYTES', str(256 * 1024 * 1024)))}",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+]
+
+# Workers starting together wait this long for another one's migrations
+MIGRATION_TIMEOUT_MS = int(os.getenv("MIGRATION_TIMEOUT_MS", "600000"))
+
+def _migration_initial(cursor: sqlite3.Cursor):
+    # Create sessions table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT UNIQUE NOT NULL,
+        pdf_name TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Create messages table
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (session_id) REFERENCES sessions (session_id)
+    )
+    ''')
+
+def _migration_documents(cursor: sqlite3.Cursor):
+    # Link sessions to their stored document
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(sessions)")]
+    if "doc_id" not in columns:
+        cursor.execute("ALTER TABLE sessions ADD COLUMN doc_id TEXT")
+    
+    # Create documents table (zlib-compressed text and retrieval index)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS documents (
+        doc_id TEXT PRIMARY KEY,
+        summary TEXT,
+        text BLOB NOT NULL,
+        index_data BLOB NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+def _migration_indexes(cursor: sqlite3.Cursor):
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_messages_session_timestamp ON messages (session_id, timestamp)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions (created_at)"
+    )
+
+def _migration_session_metadata(cursor: sqlite3.Cursor):
+    # Extraction stats live with the shared document
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(documents)")]
+    for column, kind in (("page_count", "INTEGER"), ("char_count", "INTEGER"), ("extraction_seconds", "REAL")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE documents ADD COLUMN {column} {kind}")
+    
+    # Sessions created before documents were stored only have their summary in
+    # the chat history; copy it into a column once instead of re-scanning on reload
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(sessions)")]
+    if "summary" not in columns:
+        cursor.execute("ALTER TABLE sessions ADD COLUMN summary TEXT")
+    cursor.execute('''
+    UPDATE sessions SET summary = (
+        SELECT substr(m.content, length('PDF Summary: ') + 1) FROM messages m
+        WHERE m.session_id = sessions.session_id
+          AND m.role = 'assistant' AND m.content LIKE 'PDF Summary: %'
+        ORDER BY m.timestamp, m.id LIMIT 1
+    )
+    WHERE doc_id IS NULL
+    ''')
+
+def _migration_conversation_summaries(cursor: sqlite3.Cursor):
+    # Rolling summary of older chat turns; last_message_id is the newest message folded in
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS conversation_summaries (
+        session_id TEXT PRIMARY KEY,
+        summary TEXT NOT NULL,
+        last_message_id INTEGER NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+def _migration_map_summaries(cursor: sqlite3.Cursor):
+    # Memoized map-step summaries; key hashes the chunk text, model and prompt
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS map_summaries (
+        key TEXT PRIMARY KEY,
+        summary TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+def _migration_search(cursor: sqlite3.Cursor):
+    # Full-text indexes over chat messages and retrieval chunks of documents.
+    # Both are external-content FTS5 tables kept in sync by triggers, so every
+    # insert path (add_message, bulk ingestion) updates them incrementally.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS document_chunks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        doc_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        content TEXT NOT NULL
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_chunks_doc_id ON document_chunks (doc_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_doc_id ON sessions (doc_id)")
+    # The owning session or document is indexed too, so scoped searches
+    # intersect two posting lists instead of filtering every match
+    for table, fts, owner in (("messages", "messages_fts", "session_id"), ("document_chunks", "chunks_fts", "doc_id")):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(content, {owner}, "
+            f"content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, content, {owner}) VALUES (new.id, new.content, new.{owner});
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, content, {owner}) VALUES ('delete', old.id, old.content, old.{owner});
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, content, {owner}) VALUES ('delete', old.id, old.content, old.{owner});
+            INSERT INTO {fts} (rowid, content, {owner}) VALUES (new.id, new.content, new.{owner});
+        END
+        ''')
+    
+    # Index what is already stored
+    cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+    # One document at a time, on a cursor of its own so the inserts do not reset it
+    for row in cursor.connection.execute("SELECT doc_id, index_data FROM documents"):
+        _insert_chunks(cursor, row[0], _unpack(row[1]).get("chunks", []))
+
+def _migration_session_documents(cursor: sqlite3.Cursor):
+    # Documents attached to each session, in the order they were added.
+    # sessions.doc_id keeps pointing at the first one.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS session_documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        doc_id TEXT NOT NULL,
+        pdf_name TEXT,
+        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (session_id, doc_id),
+        FOREIGN KEY (session_id) REFERENCES sessions (session_id)
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_session_documents_doc_id ON session_documents (doc_id)")
+    cursor.execute('''
+    INSERT OR IGNORE INTO session_documents (session_id, doc_id, pdf_name, added_at)
+    SELECT session_id, doc_id, pdf_name, created_at FROM sessions WHERE doc_id IS NOT NULL ORDER BY id
+    ''')
+
+def _migration_chunk_pages(cursor: sqlite3.Cursor):
+    # Page span of each searchable chunk; NULL for documents indexed before
+    # spans were recorded
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(document_chunks)")]
+    for column in ("page", "end_page"):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE document_chunks ADD COLUMN {column} INTEGER")
+
+def _insert_chunks(conn, doc_id: str, chunks: List[str], pages: Optional[List[Tuple[int, int]]] = None):
+    """Replace a document's searchable chunks, with their page spans when known"""
+    conn.execute("DELETE FROM document_chunks WHERE doc_id = ?", (doc_id,))
+    if pages is None:
+        # Also used by _migration_search, before the page columns exist
+        conn.executemany(
+            "INSERT INTO document_chunks (doc_id, position, content) VALUES (?, ?, ?)",
+            [(doc_id, position, chunk) for position, chunk in enumerate(chunks)]
+        )
+        return
+    conn.executemany(
+        "INSERT INTO document_chunks (doc_id, position, content, page, end_page) VALUES (?, ?, ?, ?, ?)",
+        [(doc_id, position, chunk, *span) for position, (chunk, span) in enumerate(zip(chunks, pages))]
+    )
+
+def timed_query(method):
+    """Record a ChatDatabase method's latency in /metrics and Server-Timing"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            DB_QUERY_SECONDS.observe(elapsed, query=method.__name__)
+            record("db", elapsed)
+    return wrapper
+
+# Schema migrations in order; the database's PRAGMA user_version records how
+# many have been applied. Only ever append to this list.
+MIGRATIONS = [
+    _migration_initial,
+    _migration_documents,
+    _migration_indexes,
+    _migration_session_metadata,
+    _migration_conversation_summaries,
+    _migration_map_summaries,
+    _migration_search,
+    _migration_session_documents,
+    _migration_chunk_pages,
+]
+
 class ChatDatabase:
     def __init__(self, db_path=None):
         # Use environment variable for database path if not specified
         self.db_path = db_path or os.getenv("DATABASE_PATH", "chat_history.db")
-        self._create_tables()
+        # One connection per thread, reused across calls; (thread, connection) pairs
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._migrate()
     
-    def _create_tables(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create sessions table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT UNIQUE NOT NULL,
-            pdf_name TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Create messages table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT NOT NULL,
-            role TEXT NOT NULL,
-            content TEXT NOT NULL,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (session_id) REFERENCES sessions (session_id)
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Only the owning thread queries it; other threads may close it
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._prune()
+                self._connections.append((threading.current_thread(), conn))
+        return conn
+    
+    def _prune(self):
+        """Close the connections of threads that have exited, such as short-lived pool threads"""
+        alive = []
+        for thread, conn in self._connections:
+            if thread.is_alive():
+                alive.append((thread, conn))
+            else:
+                conn.close()
+        self._connections = alive
+    
+    def close(self):
+        """Close every pooled connection"""
+        with self._connections_lock:
+            for _, conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
     
-    def create_session(self, session_id: str, pdf_name: Optional[str] = None) -> bool:
+    def schema_version(self) -> int:
+        return self._connection().execute("PRAGMA user_version").fetchone()[0]
+    
+    def _migrate(self):
+        """
+        Apply any migrations the database has not seen yet, with their
+        version bumps, in one transaction. sqlite3 would otherwise commit
+        each schema change on its own, so a failed or concurrent start could
+        leave columns added without the version recorded. Workers starting
+        together queue on the write lock, and the ones after the first find
+        the version already current.
+        """
+        conn = self._connection()
+        if self.schema_version() >= len(MIGRATIONS):
+            return
+        conn.execute(f"PRAGMA busy_timeout={MIGRATION_TIMEOUT_MS}")
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO sessions (session_id, pdf_name) VALUES (?, ?)",
-                (session_id, pdf_name)
-            )
-            conn.commit()
-            conn.close()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = self.schema_version()
+                for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                    migration(conn.cursor())
+                    conn.execute(f"PRAGMA user_version = {number}")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        finally:
+            conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    
+    @timed_query
+    def create_session(self, session_id: str, pdf_name: Optional[str] = None, doc_id: Optional[str] = None) -> bool:
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO sessions (session_id, pdf_name, doc_id) VALUES (?, ?, ?)",
+                    (session_id, pdf_name, doc_id)
+                )
+                if doc_id:
+                    conn.execute(
+                        "INSERT INTO session_documents (session_id, doc_id, pdf_name) VALUES (?, ?, ?)",
+                        (session_id, doc_id, pdf_name)
+                    )
             return True
         except sqlite3.IntegrityError:
             # Session already exists
             return False
     
+    @timed_query
     def add_message(self, session_id: str, role: str, content: str) -> bool:
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
-                (session_id, role, content)
-            )
-            conn.commit()
-            conn.close()
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                    (session_id, role, content)
+                )
             return True
         except Exception as e:
             print(f"Error adding message: {e}")
             return False
     
+    @timed_query
     def get_session_messages(self, session_id: str) -> List[dict]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY timestamp",
+        cursor = self._connection().execute(
+            "SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY timestamp, id",
             (session_id,)
         )
+        return [dict(row) for row in cursor.fetchall()]
+    
+    @timed_query
+    def list_sessions(self, limit: int = 50, after: Optional[str] = None,
+                      since: Optional[str] = None, search: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        One page of sessions, newest first, using keyset pagination.
+        Returns the page and the cursor for the next one (None at the end).
+        """
+        query = "SELECT id, session_id, pdf_name, created_at FROM sessions WHERE 1 = 1"
+        params = []
+        if after:
+            created_at, row_id = decode_cursor(after)
+            query += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params += [created_at, created_at, row_id]
+        if since:
+            query += " AND created_at > ?"
+            params.append(since)
+        if search:
+            query += " AND pdf_name LIKE ? ESCAPE '\\'"
+            params.append("%" + _escape_like(search) + "%")
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
         
-        messages = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        rows = self._connection().execute(query, params).fetchall()
+        return _page(rows, limit, "created_at")
+    
+    @timed_query
+    def list_messages(self, session_id: str, limit: int = 200, after: Optional[str] = None,
+                      since: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """One page of a session's messages, oldest first, using keyset pagination"""
+        query = "SELECT id, role, content, timestamp FROM messages WHERE session_id = ?"
+        params = [session_id]
+        if after:
+            timestamp, row_id = decode_cursor(after)
+            query += " AND (timestamp > ? OR (timestamp = ? AND id > ?))"
+            params += [timestamp, timestamp, row_id]
+        if since:
+            query += " AND timestamp > ?"
+            params.append(since)
+        query += " ORDER BY timestamp, id LIMIT ?"
+        params.append(limit + 1)
         
-        return messages
+        rows = self._connection().execute(query, params).fetchall()
+        return _page(rows, limit, "timestamp")
+    
+    @timed_query
+    def get_messages_after(self, session_id: str, after_id: int = 0) -> List[dict]:
+        """Messages with id greater than `after_id`, oldest first"""
+        cursor = self._connection().execute(
+            "SELECT id, role, content, timestamp FROM messages WHERE session_id = ? AND id > ? ORDER BY id",
+            (session_id, after_id)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    
+    @timed_query
+    def get_conversation_summary(self, session_id: str) -> Dict[str, Any]:
+        row = self._connection().execute(
+            "SELECT summary, last_message_id FROM conversation_summaries WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if row is None:
+            return {"summary": "", "last_message_id": 0}
+        return dict(row)
+    
+    @timed_query
+    def save_conversation_summary(self, session_id: str, summary: str, last_message_id: int) -> bool:
+        conn = self._connection()
+        with conn:
+            # Never move backwards if two folds race
+            cursor = conn.execute(
+                """
+                INSERT INTO conversation_summaries (session_id, summary, last_message_id) VALUES (?, ?, ?)
+                ON CONFLICT (session_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    last_message_id = excluded.last_message_id,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE excluded.last_message_id > conversation_summaries.last_message_id
+                """,
+                (session_id, summary, last_message_id)
+            )
+        return cursor.rowcount > 0
     
-    def get_all_sessions(self) -> List[dict]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    @timed_query
+    def add_session_document(self, session_id: str, doc_id: str, pdf_name: Optional[str] = None) -> bool:
+        """Attach a stored document to a session; False if it was already attached"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO session_documents (session_id, doc_id, pdf_name) VALUES (?, ?, ?)",
+                (session_id, doc_id, pdf_name)
+            )
+            # Sessions created without a document adopt their first one
+            conn.execute("UPDATE sessions SET doc_id = ? WHERE session_id = ? AND doc_id IS NULL", (doc_id, session_id))
+        return cursor.rowcount > 0
+    
+    @timed_query
+    def get_session_documents(self, session_id: str) -> List[dict]:
+        """A session's documents in the order they were added, with their stats"""
+        rows = self._connection().execute(
+            """
+            SELECT sd.doc_id, sd.pdf_name, sd.added_at, d.page_count, d.char_count
+            FROM session_documents sd LEFT JOIN documents d ON d.doc_id = sd.doc_id
+            WHERE sd.session_id = ?
+            ORDER BY sd.id
+            """,
+            (session_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    
+    @timed_query
+    def get_document_name(self, doc_id: str) -> Optional[str]:
+        """File name the document was first uploaded under"""
+        row = self._connection().execute(
+            "SELECT pdf_name FROM session_documents WHERE doc_id = ? ORDER BY id LIMIT 1", (doc_id,)
+        ).fetchone()
+        return row[0] if row is not None else None
+    
+    @timed_query
+    def save_document(self, doc_id: str, text: str, index_data: Dict[str, Any], summary: Optional[str] = None,
+                      page_count: Optional[int] = None, extraction_seconds: Optional[float] = None) -> bool:
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO documents
+                        (doc_id, summary, text, index_data, page_count, char_count, extraction_seconds)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (doc_id, summary, _pack(text), _pack(index_data), page_count, len(text), extraction_seconds)
+                )
+                _insert_chunks(conn, doc_id, index_data.get("chunks", []), index_data.get("pages"))
+            return True
+        except Exception as e:
+            print(f"Error saving document: {e}")
+            return False
+    
+    @timed_query
+    def save_documents(self, documents: List[Tuple[str, str, Dict[str, Any], Optional[str], Optional[int], Optional[float]]]) -> bool:
+        """Bulk save_document: (doc_id, text, index_data, summary, page_count, extraction_seconds) rows in one transaction"""
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO documents
+                        (doc_id, summary, text, index_data, page_count, char_count, extraction_seconds)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    [
+                        (doc_id, summary, _pack(text), _pack(index_data), page_count, len(text), seconds)
+                        for doc_id, text, index_data, summary, page_count, seconds in documents
+                    ]
+                )
+                for doc_id, _, index_data, _, _, _ in documents:
+                    _insert_chunks(conn, doc_id, index_data.get("chunks", []), index_data.get("pages"))
+            return True
+        except Exception as e:
+            print(f"Error saving documents: {e}")
+            return False
+    
+    @timed_query
+    def create_sessions(self, sessions: List[Tuple[str, str, str, str]]) -> bool:
+        """
+        Bulk session creation: (session_id, pdf_name, doc_id, summary) rows.
+        Sessions and their "PDF Summary" messages are inserted in one transaction.
+        """
+        try:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO sessions (session_id, pdf_name, doc_id) VALUES (?, ?, ?)",
+                    [(session_id, pdf_name, doc_id) for session_id, pdf_name, doc_id, _ in sessions]
+                )
+                conn.executemany(
+                    "INSERT INTO session_documents (session_id, doc_id, pdf_name) VALUES (?, ?, ?)",
+                    [(session_id, doc_id, pdf_name) for session_id, pdf_name, doc_id, _ in sessions]
+                )
+                conn.executemany(
+                    "INSERT INTO messages (session_id, role, content) VALUES (?, 'assistant', ?)",
+                    [(session_id, f"PDF Summary: {summary}") for session_id, _, _, summary in sessions]
+                )
+            return True
+        except Exception as e:
+            print(f"Error creating sessions: {e}")
+            return False
+    
+    @timed_query
+    def get_document_summaries(self, doc_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Summaries of the stored documents among `doc_ids`, without loading their text"""
+        summaries = {}
+        doc_ids = list(doc_ids)
+        # Stay under SQLite's host parameter limit
+        for start in range(0, len(doc_ids), 500):
+            batch = doc_ids[start:start + 500]
+            rows = self._connection().execute(
+                f"SELECT doc_id, summary FROM documents WHERE doc_id IN ({', '.join('?' * len(batch))})",
+                batch
+            ).fetchall()
+            summaries.update({row["doc_id"]: row["summary"] for row in rows})
+        return summaries
+    
+    @timed_query
+    def search(self, query: str, scope: str = "all", session_id: Optional[str] = None,
+               limit: int = 20, after: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Full-text search over chat messages and document chunks, best BM25
+        match first, with highlighted snippets. `scope` is "all",
+        "messages" or "documents"; `session_id` restricts results to one
+        session's messages and document. Returns a page and the cursor for
+        the next one.
         
-        cursor.execute(
-            "SELECT session_id, pdf_name, created_at FROM sessions ORDER BY created_at DESC"
+        Ranking every match of a very common term costs time proportional
+        to the match count, so each kind ranks only its newest
+        SEARCH_MAX_CANDIDATES matches; the cut-off is kept in the cursor so
+        later pages rank the same set.
+        """
+        match = fts_query(query)
+        if not match:
+            return [], None
+        match = f"content : ({match})"
+        kinds = [kind for kind, name in ((0, "messages"), (1, "documents")) if scope in ("all", name)]
+        # Results are ordered by (score, kind, rowid); the cursor is the last one seen
+        last = None
+        if after:
+            last, floors = _decode_search_cursor(after)
+        else:
+            floors = None
+        
+        matches = {kind: match for kind in kinds}
+        if session_id:
+            if not fts_query(session_id):
+                return [], None
+            if 0 in kinds:
+                matches[0] = f"session_id : {fts_query(session_id)} AND {match}"
+            if 1 in kinds:
+                doc_ids = [row[0] for row in self._connection().execute(
+                    "SELECT doc_id FROM session_documents WHERE session_id = ?", (session_id,)
+                )]
+                if doc_ids:
+                    documents = " OR ".join(f"doc_id : {fts_query(doc_id)}" for doc_id in doc_ids)
+                    matches[1] = f"({documents}) AND {match}"
+                else:
+                    del matches[1]
+        if floors is None:
+            floors = [self._candidate_floor(kind, matches[kind]) if kind in matches else 0 for kind in (0, 1)]
+        
+        results = []
+        for kind in matches:
+            results += self._search_table(kind, matches[kind], limit, last, floors[kind])
+        results.sort(key=lambda r: (r["score"], r["kind"], r["id"]))
+        
+        page = results[:limit]
+        next_cursor = None
+        if len(results) > limit:
+            next_cursor = encode_cursor([page[-1]["score"], page[-1]["kind"], floors], page[-1]["id"])
+        self._attach_sessions([r for r in page if r["kind"] == 1])
+        for result in page:
+            result["type"] = "message" if result.pop("kind") == 0 else "document"
+            result["score"] = round(-result["score"], 4)
+            del result["id"]
+        return page, next_cursor
+    
+    def _candidate_floor(self, kind: int, match: str) -> int:
+        """Lowest rowid among the newest SEARCH_MAX_CANDIDATES matches, 0 when there are fewer"""
+        fts = SEARCH_TABLES[kind][0]
+        row = self._connection().execute(
+            f"SELECT rowid FROM {fts} WHERE {fts} MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            (match, SEARCH_MAX_CANDIDATES - 1)
+        ).fetchone()
+        return row[0] if row is not None else 0
+    
+    def _search_table(self, kind: int, match: str, limit: int,
+                      last: Optional[Tuple[float, int, int]], floor: int) -> List[dict]:
+        fts, details = SEARCH_TABLES[kind]
+        # Rank on the FTS index alone (the owner column carries no weight),
+        # then snippet and join just the page
+        query = (
+            f"SELECT rowid AS id, bm25({fts}, 1.0, 0.0) AS score FROM {fts} "
+            f"WHERE {fts} MATCH ? AND rowid >= ?"
         )
+        params: List[Any] = [match, floor]
+        if last is not None:
+            score, last_kind, row_id = last
+            if kind < last_kind:
+                query += f" AND bm25({fts}, 1.0, 0.0) > ?"
+                params.append(score)
+            elif kind == last_kind:
+                query += f" AND (bm25({fts}, 1.0, 0.0) > ? OR (bm25({fts}, 1.0, 0.0) = ? AND rowid > ?))"
+                params += [score, score, row_id]
+            else:
+                query += f" AND bm25({fts}, 1.0, 0.0) >= ?"
+                params.append(score)
+        query += " ORDER BY score, id LIMIT ?"
+        params.append(limit + 1)
+        conn = self._connection()
+        scores = {row["id"]: row["score"] for row in conn.execute(query, params).fetchall()}
+        if not scores:
+            return []
+        rows = conn.execute(
+            details.format(ids=", ".join("?" * len(scores))), [match, *scores]
+        ).fetchall()
+        return [dict(row, kind=kind, score=scores[row["id"]]) for row in rows]
+    
+    def _attach_sessions(self, results: List[dict], per_document: int = 10):
+        """List the sessions (up to `per_document`) that use each matched document"""
+        doc_ids = list({r["doc_id"] for r in results})
+        sessions: Dict[str, List[dict]] = {doc_id: [] for doc_id in doc_ids}
+        if doc_ids:
+            rows = self._connection().execute(
+                f"SELECT session_id, pdf_name, doc_id FROM session_documents WHERE doc_id IN ({', '.join('?' * len(doc_ids))}) "
+                "ORDER BY id DESC",
+                doc_ids
+            ).fetchall()
+            for row in rows:
+                if len(sessions[row["doc_id"]]) < per_document:
+                    sessions[row["doc_id"]].append({"session_id": row["session_id"], "pdf_name": row["pdf_name"]})
+        for result in results:
+            result["sessions"] = sessions[result["doc_id"]]
+    
+    @timed_query
+    def get_map_summary(self, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT summary FROM map_summaries WHERE key = ?", (key,)
+        ).fetchone()
+        return row["summary"] if row is not None else None
+    
+    @timed_query
+    def save_map_summary(self, key: str, summary: str) -> bool:
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO map_summaries (key, summary) VALUES (?, ?)",
+                    (key, summary)
+                )
+            return True
+        except Exception as e:
+            print(f"Error saving map summary: {e}")
+            return False
+    
+    @timed_query
+    def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT doc_id, summary, text, index_data FROM documents WHERE doc_id = ?",
+            (doc_id,)
+        ).fetchone()
+        return _document_from_row(row) if row is not None else None
+    
+    @timed_query
+    def get_session(self, session_id: str) -> Optional[dict]:
+        """Session metadata (with its document's summary and stats) by id"""
+        row = self._connection().execute(
+            """
+            SELECT s.session_id, s.pdf_name, s.created_at, s.doc_id,
+                   COALESCE(d.summary, s.summary) AS summary,
+                   d.page_count, d.char_count, d.extraction_seconds
+            FROM sessions s LEFT JOIN documents d ON d.doc_id = s.doc_id
+            WHERE s.session_id = ?
+            """,
+            (session_id,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+def encode_cursor(sort_value: str, row_id: int) -> str:
+    """Opaque pagination cursor for the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps([sort_value, row_id]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return sort_value, int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _decode_search_cursor(cursor: str) -> Tuple[Tuple[float, int, int], List[int]]:
+    """(score, kind, rowid) of the last result seen and the candidate floors"""
+    sort_value, row_id = decode_cursor(cursor)
+    try:
+        score, kind, floors = sort_value
+        floors = [int(floor) for floor in floors]
+        if len(floors) != 2 or int(kind) not in (0, 1):
+            raise ValueError
+        return (float(score), int(kind), row_id), floors
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+def _page(rows: List[sqlite3.Row], limit: int, sort_column: str) -> Tuple[List[dict], Optional[str]]:
+    # One extra row was fetched to tell whether another page exists
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1][sort_column], items[-1]["id"])
+    for item in items:
+        del item["id"]
+    return items, next_cursor
+
+# Matches ranked per query and kind; see ChatDatabase.search
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "20000"))
+
+# Per searchable kind: FTS table and the page details with snippets.
+# bm25() is negative, lower is a better match.
+SEARCH_TABLES = {
+    0: (
+        "messages_fts",
+        """
+        SELECT m.id, m.session_id, m.role, m.timestamp, s.pdf_name,
+               snippet(messages_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet
+        FROM messages_fts
+        JOIN messages m ON m.id = messages_fts.rowid
+        LEFT JOIN sessions s ON s.session_id = m.session_id
+        WHERE messages_fts MATCH ? AND messages_fts.rowid IN ({ids})
+        """,
+    ),
+    1: (
+        "chunks_fts",
+        """
+        SELECT c.id, c.doc_id, c.position, c.page, c.end_page,
+               snippet(chunks_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet
+        FROM chunks_fts
+        JOIN document_chunks c ON c.id = chunks_fts.rowid
+        WHERE chunks_fts MATCH ? AND chunks_fts.rowid IN ({ids})
+        """,
+    ),
+}
+
+def fts_query(text: str) -> str:
+    """
+    FTS5 MATCH expression for free text: every whitespace-separated term
+    must appear, and punctuation inside a term ("14.2") becomes a phrase
+    of its parts. User input never reaches the FTS5 query syntax.
+    """
+    phrases = []
+    for term in text.split():
+        tokens = re.findall(r"\w+", term)
+        if tokens:
+            phrases.append('"' + " ".join(tokens) + '"')
+    return " ".join(phrases)
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _document_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "doc_id": row["doc_id"],
+        "summary": row["summary"],
+        "text": _unpack(row["text"]),
+        "index_data": _unpack(row["index_data"])
+    }
+
+class AsyncChatDatabase:
+    """
+    Awaitable view of a ChatDatabase: every method runs in a worker thread
+    so SQLite I/O never blocks the event loop.
+    """
+    
+    def __init__(self, db: ChatDatabase):
+        self.db = db
+    
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
         
-        sessions = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(method, *args, **kwargs)
         
-        return sessions 
\ No newline at end of file
+        return call
+
+def _pack(value) -> bytes:
+    """Serialize to JSON and zlib-compress for BLOB storage"""
+    return zlib.compress(json.dumps(value).encode("utf-8"))
+
+def _unpack(blob: bytes):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
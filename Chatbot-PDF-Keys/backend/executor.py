@@ -0,0 +1,65 @@
+import asyncio
+import contextvars
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Any
+
+from fastapi.concurrency import run_in_threadpool
+
+# CPU-bound PDF parsing runs in worker processes so it never holds the GIL
+# of the event loop process
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# LLM calls get their own threads so long summarizations cannot exhaust the
+# shared threadpool used for quick database work
+LLM_THREADS = int(os.getenv("LLM_THREADS", "8"))
+
+_process_pool = None
+_llm_pool = None
+# Job threads may ask for a pool at the same time; only one must be created
+_pool_lock = threading.Lock()
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        with _pool_lock:
+            if _process_pool is None:
+                # Forking this multi-threaded process could copy a lock another
+                # thread holds (imports, SQLite) into a worker and deadlock it.
+                # Workers come from a clean fork server that only loads the
+                # extraction module instead.
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload(["extraction"])
+                _process_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=context)
+    return _process_pool
+
+def get_llm_pool() -> ThreadPoolExecutor:
+    global _llm_pool
+    if _llm_pool is None:
+        with _pool_lock:
+            if _llm_pool is None:
+                _llm_pool = ThreadPoolExecutor(max_workers=LLM_THREADS, thread_name_prefix="llm")
+    return _llm_pool
+
+async def run_llm(func: Callable, *args) -> Any:
+    """Run a blocking LLM call in the dedicated LLM threads"""
+    loop = asyncio.get_running_loop()
+    # Carry the request context over so timings land in its Server-Timing
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_llm_pool(), context.run, func, *args)
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run short blocking work (database access, index lookups) in the shared threadpool"""
+    return await run_in_threadpool(func, *args, **kwargs)
+
+def shutdown():
+    global _process_pool, _llm_pool
+    with _pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+        if _llm_pool is not None:
+            _llm_pool.shutdown(wait=False, cancel_futures=True)
+            _llm_pool = None
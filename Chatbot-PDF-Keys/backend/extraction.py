@@ -0,0 +1,122 @@
+import io
+import mmap
+import os
+import time
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple, Union
+
+# Longest text kept from a single page; protects memory from pathological pages
+MAX_PAGE_CHARS = int(os.getenv("MAX_PAGE_CHARS", "200000"))
+
+# Documents with at least this many pages are split into page ranges across
+# the process pool; smaller ones are parsed there as a single range
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PARALLEL_PAGE_THRESHOLD", "200"))
+
+# A PDF is given either as bytes or as the path of a file on disk. Files are
+# memory-mapped, so pages are read from the page cache instead of being
+# copied into the Python heap; only a path crosses into worker processes.
+PdfSource = Union[bytes, str]
+
+@contextmanager
+def open_pdf(source: PdfSource) -> Iterator["PyPDF2.PdfReader"]:
+    # Imported on first use; the API process only needs it once a PDF arrives
+    import PyPDF2
+    if isinstance(source, bytes):
+        yield PyPDF2.PdfReader(io.BytesIO(source))
+        return
+    with open(source, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield PyPDF2.PdfReader(mapped)
+        finally:
+            mapped.close()
+
+def _page_text(page) -> str:
+    text = page.extract_text() or ""
+    return text[:MAX_PAGE_CHARS]
+
+def extract_page_range(source: PdfSource, start: int, end: int) -> List[str]:
+    """Text of pages [start, end); module level so it can run in a process pool"""
+    with open_pdf(source) as reader:
+        return [_page_text(reader.pages[i]) for i in range(start, end)]
+
+def iter_pages(source: PdfSource, pool: Optional[Executor] = None,
+               workers: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) in page order, starting from 1.
+
+    With a `pool` (a process pool), parsing happens in its workers: small
+    documents as one page range, large ones split into several ranges
+    that are yielded as soon as they and every range before them are done,
+    so callers can start chunking before the whole file is parsed. Without
+    one, pages are parsed in the calling thread.
+    """
+    with open_pdf(source) as reader:
+        page_count = len(reader.pages)
+        if pool is None:
+            for i, page in enumerate(reader.pages):
+                yield i + 1, _page_text(page)
+            return
+
+    if workers == 1 or page_count < PARALLEL_PAGE_THRESHOLD:
+        yield from enumerate(pool.submit(extract_page_range, source, 0, page_count).result(), start=1)
+        return
+
+    # A few ranges per worker keeps the first results coming quickly
+    ranges_count = (workers or os.cpu_count() or 1) * 4
+    size = max(1, -(-page_count // ranges_count))
+    futures = [
+        (start, pool.submit(extract_page_range, source, start, min(start + size, page_count)))
+        for start in range(0, page_count, size)
+    ]
+    try:
+        for start, future in futures:
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+    finally:
+        for _, future in futures:
+            future.cancel()
+
+class PageStream:
+    """
+    Single pass over a PDF's pages that remembers what it read.
+
+    Iterate it to feed a chunker; afterwards `text`, `page_count` and
+    `seconds` (time spent parsing) describe the whole document.
+    """
+
+    def __init__(self, source: PdfSource, pool: Optional[Executor] = None, workers: Optional[int] = None):
+        self.source = source
+        self.pool = pool
+        self.workers = workers
+        self.pages: List[str] = []
+        self.seconds = 0.0
+
+    def __iter__(self) -> Iterator[Tuple[int, str]]:
+        pages = iter_pages(self.source, self.pool, self.workers)
+        while True:
+            started = time.perf_counter()
+            try:
+                number, text = next(pages)
+            except StopIteration:
+                self.seconds += time.perf_counter() - started
+                return
+            self.seconds += time.perf_counter() - started
+            self.pages.append(text)
+            yield number, text
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def text(self) -> str:
+        return "".join(page + "\n" for page in self.pages)
+
+def extract_all(source: PdfSource) -> Tuple[List[str], float]:
+    """Every page's text and the seconds spent parsing; module level so it can run in a process pool"""
+    pages = PageStream(source)
+    for _ in pages:
+        pass
+    return pages.pages, pages.seconds
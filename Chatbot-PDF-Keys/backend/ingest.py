@@ -0,0 +1,209 @@
+"""
+Bulk PDF ingestion shared by POST /summarize/batch and the command line.
+
+Usage: python ingest.py DIRECTORY [--recursive] [--workers 4] [--report report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from extraction import extract_all
+from metrics import STAGE_SECONDS
+from uploads import hash_file
+
+class BatchIngester:
+    """
+    Ingest many PDFs at once.
+
+    Files are hashed and deduplicated by content, both within the batch and
+    against stored documents; duplicates get a session pointing at the
+    existing document. Each new document is extracted in `pool` (a process
+    pool), summarized on one of `workers` threads and indexed; LLM
+    concurrency stays bounded by the summarizer's client. Finished documents,
+    their sessions and summary messages are written `commit_size` at a time
+    in bulk transactions; `on_commit()` is called after each one.
+    """
+
+    def __init__(self, db, summarizer, pool: Optional[Executor] = None,
+                 workers: int = None, commit_size: int = None, on_commit: Optional[Callable[[], None]] = None):
+        self.db = db
+        self.on_commit = on_commit
+        self.summarizer = summarizer
+        self.pool = pool
+        self.workers = workers or int(os.getenv("BATCH_WORKERS", "4"))
+        self.commit_size = commit_size or int(os.getenv("BATCH_COMMIT_SIZE", "20"))
+
+    def _extract(self, path: str) -> Tuple[List[str], float]:
+        if self.pool is None:
+            return extract_all(path)
+        return self.pool.submit(extract_all, path).result()
+
+    def _process(self, path: str, doc_id: str) -> Dict[str, Any]:
+        """Extract, summarize and index one document"""
+        timings = {}
+        pages, timings["extract"] = self._extract(path)
+        STAGE_SECONDS.observe(timings["extract"], stage="extract")
+
+        started = time.perf_counter()
+        summary = self.summarizer.summarize_pages(enumerate(pages, start=1))
+        timings["summarize"] = time.perf_counter() - started
+
+        text = "".join(page + "\n" for page in pages)
+        started = time.perf_counter()
+        index = self.summarizer.build_index(text, pages)
+        timings["index"] = time.perf_counter() - started
+        return {
+            "row": (doc_id, text, index.to_dict(), summary, len(pages), timings["extract"]),
+            "summary": summary,
+            "pages": len(pages),
+            "timings": timings,
+        }
+
+    def ingest(self, files: List[Tuple[str, str]], on_progress: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        Ingest (file name, path) pairs. Returns totals and a per-file report
+        with status ("created", "duplicate" or "failed"), session id and
+        timings in seconds.
+        """
+        started = time.perf_counter()
+        reports = [{"file": name, "status": "pending", "timings": {}} for name, _ in files]
+
+        # Hash in parallel; reading files is I/O bound
+        with ThreadPoolExecutor(max_workers=self.workers) as threads:
+            def hashed(i: int) -> Optional[str]:
+                hash_started = time.perf_counter()
+                try:
+                    doc_id = hash_file(files[i][1])
+                except OSError as e:
+                    reports[i].update(status="failed", error=str(e))
+                    return None
+                reports[i]["timings"]["hash"] = round(time.perf_counter() - hash_started, 4)
+                return doc_id
+            doc_ids = list(threads.map(hashed, range(len(files))))
+
+        stored = self.db.get_document_summaries({doc_id for doc_id in doc_ids if doc_id})
+        first_seen: Dict[str, int] = {}
+        waiting: Dict[str, List[int]] = {}  # doc_id -> duplicates of a document still being processed
+        sessions = []
+        for i, doc_id in enumerate(doc_ids):
+            if doc_id is None:
+                continue
+            reports[i]["doc_id"] = doc_id
+            if doc_id in stored:
+                sessions.append(self._session(reports[i], doc_id, stored[doc_id], "duplicate"))
+            elif doc_id in first_seen:
+                waiting.setdefault(doc_id, []).append(i)
+            else:
+                first_seen[doc_id] = i
+
+        documents = []
+        done = len(files) - len(first_seen) - sum(len(v) for v in waiting.values())
+        with ThreadPoolExecutor(max_workers=self.workers) as threads:
+            futures = {
+                threads.submit(self._process, files[i][1], doc_id): (i, doc_id)
+                for doc_id, i in first_seen.items()
+            }
+            for future in as_completed(futures):
+                i, doc_id = futures[future]
+                duplicates = waiting.get(doc_id, [])
+                try:
+                    result = future.result()
+                except Exception as e:
+                    for j in [i] + duplicates:
+                        reports[j].update(status="failed", error=str(e))
+                else:
+                    reports[i]["pages"] = result["pages"]
+                    reports[i]["timings"].update({k: round(v, 4) for k, v in result["timings"].items()})
+                    documents.append(result["row"])
+                    sessions.append(self._session(reports[i], doc_id, result["summary"], "created"))
+                    for j in duplicates:
+                        sessions.append(self._session(reports[j], doc_id, result["summary"], "duplicate"))
+                done += 1 + len(duplicates)
+                if on_progress:
+                    on_progress("ingesting", done, len(files), None)
+                if len(documents) >= self.commit_size:
+                    self._flush(documents, sessions, reports)
+                    documents, sessions = [], []
+        self._flush(documents, sessions, reports)
+
+        counts = {status: sum(1 for r in reports if r["status"] == status) for status in ("created", "duplicate", "failed")}
+        return {
+            "files": len(files),
+            **counts,
+            "seconds": round(time.perf_counter() - started, 3),
+            "report": reports,
+        }
+
+    def _session(self, report: Dict[str, Any], doc_id: str, summary: str, status: str) -> Tuple[str, str, str, str]:
+        report["session_id"] = str(uuid.uuid4())
+        report["status"] = status
+        return (report["session_id"], report["file"], doc_id, summary or "")
+
+    def _flush(self, documents: List[Tuple], sessions: List[Tuple], reports: List[Dict[str, Any]]):
+        """Write finished documents, then the sessions that point at them, in bulk"""
+        if not documents and not sessions:
+            return
+        started = time.perf_counter()
+        saved = self.db.save_documents(documents) if documents else True
+        created = saved and self.db.create_sessions(sessions)
+        elapsed = round(time.perf_counter() - started, 4)
+        if created and self.on_commit:
+            self.on_commit()
+        session_ids = {session[0] for session in sessions}
+        for report in reports:
+            if report.get("session_id") in session_ids:
+                report["timings"]["store"] = elapsed
+                if not created:
+                    report.update(status="failed", error="Could not save to the database")
+
+def find_pdfs(directory: str, recursive: bool = False) -> List[Tuple[str, str]]:
+    """(file name, path) of the PDFs in a directory, sorted by path"""
+    if recursive:
+        paths = [os.path.join(root, name) for root, _, names in os.walk(directory) for name in names]
+    else:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    return [(os.path.basename(path), path) for path in sorted(paths)
+            if path.lower().endswith(".pdf") and os.path.isfile(path)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--recursive", action="store_true")
+    parser.add_argument("--workers", type=int, help="documents processed at once (default BATCH_WORKERS)")
+    parser.add_argument("--report", help="write the per-file JSON report here")
+    args = parser.parse_args()
+
+    from db import ChatDatabase
+    from executor import get_process_pool, shutdown
+    from summarizer import PDFSummarizer
+
+    files = find_pdfs(args.directory, args.recursive)
+    if not files:
+        sys.exit(f"No PDF files in {args.directory}")
+    print(f"Ingesting {len(files)} PDFs from {args.directory}")
+
+    db = ChatDatabase()
+    ingester = BatchIngester(db, PDFSummarizer(map_memo=db), pool=get_process_pool(), workers=args.workers)
+    try:
+        result = ingester.ingest(
+            files, on_progress=lambda stage, done, total, _: print(f"{done}/{total}", end="\r", flush=True)
+        )
+    finally:
+        shutdown()
+    print()
+
+    for report in result["report"]:
+        print(f"{report['status']:<9} {report['file']}" + (f"  ({report['error']})" if report.get("error") else ""))
+    print(f"{result['created']} created, {result['duplicate']} duplicates, {result['failed']} failed "
+          f"in {result['seconds']}s")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
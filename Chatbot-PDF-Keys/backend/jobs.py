@@ -0,0 +1,189 @@
+import itertools
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+class Job:
+    """State of one background summarization job, updated by the worker running it"""
+
+    def __init__(self, job_id: str, session_id: Optional[str] = None,
+                 on_change: Optional[Callable[["Job"], None]] = None):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.status = "queued"  # queued, running, done, failed
+        self.stage = "queued"
+        self.done = 0
+        self.total = 0
+        self.partial_results: List[str] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.stage_started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.on_change = on_change
+        self._lock = threading.Lock()
+
+    def update(self, stage: str, done: int = 0, total: int = 0, partial: Optional[str] = None):
+        """Progress callback handed to the pipeline"""
+        with self._lock:
+            if stage != self.stage:
+                self.stage_started_at = time.time()
+            self.stage = stage
+            self.done = done
+            self.total = total
+            if partial is not None:
+                self.partial_results.append(partial)
+        self.changed()
+
+    def changed(self):
+        if self.on_change is not None:
+            try:
+                self.on_change(self)
+            except Exception as e:
+                print(f"Error publishing job {self.job_id}: {e}")
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimate remaining time in the current stage from its average time per step"""
+        if self.status != "running" or not self.done or not self.total:
+            return None
+        elapsed = time.time() - (self.stage_started_at or self.started_at)
+        remaining = max(self.total - self.done, 0)
+        return round(elapsed / self.done * remaining, 1)
+
+    def progress_dict(self) -> Dict[str, Any]:
+        """Status and progress, without the partial results or the final result"""
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "session_id": self.session_id,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": {"done": self.done, "total": self.total},
+                "eta_seconds": self.eta_seconds(),
+            }
+
+    def to_dict(self) -> Dict[str, Any]:
+        job = self.progress_dict()
+        with self._lock:
+            job.update(partial_results=list(self.partial_results), result=self.result, error=self.error)
+        return job
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+class JobQueue:
+    """
+    Bounded priority queue of jobs worked through by a fixed pool of threads.
+
+    Lower priority values run first; equal priorities run in submission
+    order. `submit` raises QueueFullError instead of queueing past
+    `max_size`, so callers can apply backpressure.
+
+    With a shared `state`, every change to a job is published to it, so
+    `lookup` finds jobs run by other workers too. Running jobs publish only
+    their status and progress; partial results and the final result are
+    published once, when the job finishes.
+    """
+
+    def __init__(self, workers: int = None, max_size: int = None, keep_finished: int = 1000,
+                 state=None, state_ttl: float = 86400):
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.max_size = max_size or int(os.getenv("JOB_QUEUE_SIZE", "16"))
+        self.keep_finished = keep_finished
+        self.state = state
+        self.state_ttl = state_ttl
+        self._queue = queue.PriorityQueue(maxsize=self.max_size)
+        self._counter = itertools.count()
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func: Callable[[Job], Dict[str, Any]], priority: int = 10,
+               session_id: Optional[str] = None) -> Job:
+        """Queue `func(job)`; its return value becomes the job result"""
+        self.start()
+        job = Job(str(uuid.uuid4()), session_id, self._publish)
+        try:
+            self._queue.put_nowait((priority, next(self._counter), job, func))
+        except queue.Full:
+            raise QueueFullError(f"Job queue is full ({self.max_size} pending)")
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._trim()
+        job.changed()
+        return job
+
+    def add_finished(self, result: Dict[str, Any], session_id: Optional[str] = None) -> Job:
+        """Record a job that completed without queueing (e.g. a cache hit)"""
+        job = Job(str(uuid.uuid4()), session_id, self._publish)
+        job.status = job.stage = "done"
+        job.result = result
+        job.started_at = job.finished_at = time.time()
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._trim()
+        job.changed()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def lookup(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        State of a job run by this worker or, through the shared state, any
+        other; another worker's running job has no partial results yet
+        """
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self.state.get("jobs", job_id) if self.state is not None else None
+
+    def _publish(self, job: Job):
+        if self.state is not None:
+            # Copying every partial result on each update would make a job's writes quadratic
+            snapshot = job.to_dict() if job.finished else job.progress_dict()
+            self.state.set("jobs", job.job_id, snapshot, ttl=self.state_ttl)
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def _trim(self):
+        # Forget the oldest finished jobs; queued and running ones are kept
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            _, _, job, func = self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            job.changed()
+            try:
+                job.result = func(job)
+                job.status = job.stage = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = job.stage = "failed"
+            finally:
+                job.finished_at = time.time()
+                job.changed()
+                self._queue.task_done()
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List
+
+from chunking import get_token_counter
+from metrics import LLM_CALLS, LLM_TOKENS, stage
+
+class LLMError(Exception):
+    """Error reported by the LLM backend itself"""
+
+class LLMClient(ABC):
+    """
+    Base class for text generation backends.
+
+    Subclasses implement `_generate(prompt)` and may override
+    `_stream(prompt)`, which by default yields the whole response at once.
+    The base class caps concurrent requests at `max_concurrency`, retries
+    retryable failures `retries` times with jittered exponential backoff,
+    and coalesces identical prompts already in flight so each one is
+    generated once. `invoke(prompt) -> str` and `stream(prompt)` match what the
+    summarization, chat and memory code already call.
+    """
+
+    # Label for this backend in /metrics
+    backend = "llm"
+
+    def __init__(self, max_concurrency: int = None, retries: int = None, backoff: float = None):
+        self.max_concurrency = max_concurrency or int(
+            os.getenv("LLM_MAX_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+        )
+        self.retries = int(os.getenv("LLM_RETRIES", "2")) if retries is None else retries
+        self.backoff = backoff or float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+        # Context window the model runs with; chunk sizes are derived from it
+        self.context_tokens = int(os.getenv("LLM_CONTEXT_TOKENS", "8192"))
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failures = 0
+
+    @abstractmethod
+    def _generate(self, prompt: str) -> str:
+        pass
+
+    def _stream(self, prompt: str) -> Iterator[str]:
+        yield self._generate(prompt)
+
+    def _retryable(self, error: Exception) -> bool:
+        return isinstance(error, (ConnectionError, TimeoutError))
+
+    def _sleep_before_retry(self, attempt: int):
+        # Full jitter keeps retries from many threads from arriving together
+        with self._lock:
+            self.retried += 1
+        time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    def _call(self, prompt: str) -> str:
+        attempt = 0
+        while True:
+            try:
+                with self._slots, stage("llm"):
+                    response = self._generate(prompt)
+                self._count(prompt, response, "ok")
+                return response
+            except Exception as e:
+                self._count(prompt, "", "error")
+                if attempt >= self.retries or not self._retryable(e):
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                self._sleep_before_retry(attempt)
+                attempt += 1
+
+    def _count(self, prompt: str, response: str, outcome: str):
+        LLM_CALLS.inc(backend=self.backend, outcome=outcome)
+        counter = get_token_counter()
+        LLM_TOKENS.inc(counter.count(prompt), backend=self.backend, direction="in")
+        if response:
+            LLM_TOKENS.inc(counter.count(response), backend=self.backend, direction="out")
+
+    def invoke(self, prompt: str) -> str:
+        key = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            self.requests += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(self._call(prompt))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+        return future.result()
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Yield the response in pieces. Failures before the first piece are
+        retried; once text has been sent the error is raised to the caller.
+        """
+        with self._lock:
+            self.requests += 1
+        attempt = 0
+        while True:
+            started = False
+            response = ""
+            try:
+                with self._slots:
+                    for token in self._stream(prompt):
+                        started = True
+                        response += token
+                        yield token
+                self._count(prompt, response, "ok")
+                return
+            except Exception as e:
+                self._count(prompt, response, "error")
+                if started or attempt >= self.retries or not self._retryable(e):
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                self._sleep_before_retry(attempt)
+                attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": type(self).__name__,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": len(self._in_flight),
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+                "retried": self.retried,
+                "failures": self.failures,
+            }
+
+    def warm_up(self):
+        """Get the model ready to serve, ahead of the first request"""
+
+    def close(self):
+        pass
+
+class OllamaClient(LLMClient):
+    """
+    Ollama /api/generate over a pooled keep-alive HTTP client.
+
+    One httpx.Client is shared by all threads, so connections to the Ollama
+    server are reused instead of opened per request.
+    """
+    backend = "ollama"
+
+    def __init__(self, model: str, base_url: str = None, timeout: float = None, **kwargs):
+        # Imported here so the API process starts without loading httpx
+        import httpx
+        super().__init__(**kwargs)
+        self.model = model
+        self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        timeout = timeout or float(os.getenv("OLLAMA_TIMEOUT", "300"))
+        self.http = httpx.Client(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+                keepalive_expiry=float(os.getenv("OLLAMA_KEEPALIVE_SECONDS", "60"))
+            )
+        )
+
+    def _payload(self, prompt: str, stream: bool) -> Dict[str, Any]:
+        return {"model": self.model, "prompt": prompt, "stream": stream, "options": {"num_ctx": self.context_tokens}}
+
+    def _retryable(self, error: Exception) -> bool:
+        import httpx
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        return isinstance(error, httpx.TransportError) or super()._retryable(error)
+
+    def _generate(self, prompt: str) -> str:
+        response = self.http.post("/api/generate", json=self._payload(prompt, False))
+        response.raise_for_status()
+        return response.json().get("response", "")
+
+    def _stream(self, prompt: str) -> Iterator[str]:
+        with self.http.stream("POST", "/api/generate", json=self._payload(prompt, True)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise LLMError(data["error"])
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    return
+
+    def warm_up(self):
+        # An empty prompt makes Ollama load the model (with the context size
+        # later requests use, so it is not reloaded) without generating
+        response = self.http.post(
+            "/api/generate", json={"model": self.model, "options": {"num_ctx": self.context_tokens}}
+        )
+        response.raise_for_status()
+
+    def close(self):
+        self.http.close()
+
+class FakeLLMClient(LLMClient):
+    """
+    Deterministic offline backend for tests and load tests.
+
+    The same prompt always produces the same `tokens`-word answer, built
+    from words of the prompt. Each call waits `latency` seconds plus
+    `token_latency` per word, so throughput behaves like a real model.
+    """
+    backend = "fake"
+
+    def __init__(self, latency: float = None, token_latency: float = None, tokens: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = float(os.getenv("FAKE_LLM_LATENCY", "0.05")) if latency is None else latency
+        self.token_latency = float(os.getenv("FAKE_LLM_TOKEN_LATENCY", "0")) if token_latency is None else token_latency
+        self.tokens = tokens or int(os.getenv("FAKE_LLM_TOKENS", "32"))
+        self.calls: List[str] = []
+
+    def _words(self, prompt: str) -> List[str]:
+        words = prompt.split() or ["empty"]
+        seed = int(hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        return [words[(seed + i * 7919) % len(words)] for i in range(self.tokens)]
+
+    def _record(self, prompt: str):
+        with self._lock:
+            self.calls.append(prompt)
+
+    def _generate(self, prompt: str) -> str:
+        self._record(prompt)
+        time.sleep(self.latency + self.token_latency * self.tokens)
+        return " ".join(self._words(prompt))
+
+    def _stream(self, prompt: str) -> Iterator[str]:
+        self._record(prompt)
+        time.sleep(self.latency)
+        for i, word in enumerate(self._words(prompt)):
+            time.sleep(self.token_latency)
+            yield word if i == 0 else " " + word
+
+def create_llm(model_name: str) -> LLMClient:
+    """Backend selected by LLM_BACKEND: "ollama" (default) or "fake" for offline runs"""
+    backend = os.getenv("LLM_BACKEND", "ollama").lower()
+    if backend == "fake":
+        return FakeLLMClient()
+    if backend == "ollama":
+        return OllamaClient(model_name)
+    raise ValueError(f"Unknown LLM_BACKEND: {backend}")
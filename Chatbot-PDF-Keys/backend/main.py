@@ -1,21 +1,52 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Request
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Request, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import asyncio
 import base64
+import hashlib
+import json
 import uuid
 import os
+import sys
+import threading
 import time
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+import zipfile
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
-from db import ChatDatabase
-from models import ChatHistory, SummarizeRequest, ChatRequest
-from summarizer import PDFSummarizer
-from auth import get_api_key
+from answer_cache import AnswerCache
+from cache import LRUCache
+from db import ChatDatabase, AsyncChatDatabase
+from executor import PDF_WORKERS, get_process_pool, get_llm_pool, run_llm, run_blocking, shutdown as shutdown_executors
+from jobs import Job, JobQueue, QueueFullError
+from memory import ConversationMemory
+import metrics
+from models import ChatHistory, SummarizeRequest, ChatRequest, AttachDocumentRequest
+from extraction import PageStream
+from ingest import BatchIngester
+from profiler import profiler_from_env
+from retriever import SessionIndex
+from state import create_state
+from uploads import (
+    MAX_BATCH_EXTRACTED_BYTES, MAX_BATCH_FILES, MAX_BATCH_UPLOAD_BYTES, MAX_UPLOAD_BYTES,
+    UploadTooLargeError, remove_spool, spool_upload, spool_zip
+)
+from auth import get_api_key, get_metrics_api_key
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # on_startup and on_shutdown are defined below, once what they manage exists
+    on_startup()
+    try:
+        yield
+    finally:
+        on_shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -26,61 +57,453 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize database and summarizer
+# Initialize database (cheap: it only opens a connection and checks the
+# schema version); the summarizer is created on first use
 db = ChatDatabase()
-summarizer = PDFSummarizer()
 
-# Store PDF summaries in memory for quick access
-pdf_summaries = {}
+# Endpoints use the awaitable wrapper so SQLite calls run off the event loop
+adb = AsyncChatDatabase(db)
+
+# Processed documents keyed by SHA-256 of the uploaded bytes, bounded by
+# approximate size in memory. Sessions for the same content share one entry
+# instead of copying it; a miss transparently reloads from the database, so
+# any worker can serve any session.
+DOCUMENT_CACHE_MB = int(os.getenv("DOCUMENT_CACHE_MB", "512"))
+DOCUMENT_CACHE_TTL = float(os.getenv("DOCUMENT_CACHE_TTL", "3600"))
+
+# Cache key prefix for sessions that only have a summary (created before
+# documents were stored)
+SUMMARY_ONLY_PREFIX = "summary:"
+
+def read_document(key: str) -> Optional[Dict]:
+    """Load a processed document from the database (document cache loader)"""
+    if key.startswith(SUMMARY_ONLY_PREFIX):
+        session = db.get_session(key[len(SUMMARY_ONLY_PREFIX):])
+        if not session or not session["summary"]:
+            return None
+        # Index the summary so chat still has some document context
+        return {
+            "doc_id": None,
+            "text": "PDF text not available for reloaded sessions",
+            "summary": session["summary"],
+            "index": get_summarizer().build_index(session["summary"])
+        }
+    
+    stored = db.get_document(key)
+    if stored is None:
+        return None
+    
+    return {
+        "doc_id": key,
+        "text": stored["text"],
+        "summary": stored["summary"],
+        "index": get_summarizer().load_index(stored["index_data"])
+    }
+
+def read_session_document_keys(key: str) -> Optional[List[tuple]]:
+    """(document cache key, file name) of each of a session's documents (session cache loader)"""
+    session_id = key.rsplit(":", 1)[0]
+    documents = db.get_session_documents(session_id)
+    if documents:
+        return [(document["doc_id"], document["pdf_name"]) for document in documents]
+    session = db.get_session(session_id)
+    if session is not None and session["summary"]:
+        return [(SUMMARY_ONLY_PREFIX + session_id, session["pdf_name"])]
+    return None
+
+def document_size(document: Dict) -> int:
+    return (
+        sys.getsizeof(document["text"]) +
+        sys.getsizeof(document["summary"] or "") +
+        document["index"].nbytes()
+    )
+
+document_cache = LRUCache(
+    max_items=None,
+    max_bytes=DOCUMENT_CACHE_MB * 1024 * 1024,
+    ttl=DOCUMENT_CACHE_TTL or None,
+    sizeof=document_size,
+    loader=read_document
+)
+
+# Session id -> its documents' cache keys; entries are tiny so bounded by
+# count. Keys carry the session's "documents:" version, bumped when a
+# document is added to an existing session, so every worker sees the change.
+session_documents = LRUCache(max_items=10000, loader=read_session_document_keys)
+
+def get_session_document(session_id: str) -> Optional[Dict]:
+    """
+    A session's document, from memory or lazily loaded from the database.
+    For a session with several documents, a view with a SessionIndex over
+    all of them; its doc_id scopes the answer cache to that set.
+    """
+    version = state.version(f"documents:{session_id}")
+    keys = session_documents.get(f"{session_id}:{version}")
+    if not keys:
+        return None
+    if len(keys) == 1:
+        return document_cache.get(keys[0][0])
+    
+    # Each document's index is loaded (or shared) on its own, never rebuilt
+    sources = []
+    for key, pdf_name in keys:
+        document = document_cache.get(key)
+        if document is not None:
+            sources.append((pdf_name or key[:12], document))
+    if not sources:
+        return None
+    doc_ids = [document["doc_id"] or "" for _, document in sources]
+    return {
+        "doc_id": hashlib.sha256("+".join(doc_ids).encode("utf-8")).hexdigest(),
+        "documents": [name for name, _ in sources],
+        "index": SessionIndex([(name, document["index"]) for name, document in sources])
+    }
+
+# The summarizer and everything built on it (LLM client, LangChain, PDF
+# parsing) load on first use, so the process starts and answers /healthz
+# quickly; WARMUP=true loads them in the background at startup instead
+_summarizer = None
+_memory = None
+_ingester = None
+_lazy_lock = threading.RLock()
+
+def get_summarizer():
+    global _summarizer
+    if _summarizer is None:
+        with _lazy_lock:
+            if _summarizer is None:
+                from summarizer import PDFSummarizer
+                _summarizer = PDFSummarizer(map_memo=db)
+    return _summarizer
+
+# Recent chat turns are sent verbatim; older ones are folded into a rolling
+# per-session summary after each reply
+def get_memory() -> ConversationMemory:
+    global _memory
+    if _memory is None:
+        with _lazy_lock:
+            if _memory is None:
+                _memory = ConversationMemory(get_summarizer().llm)
+    return _memory
+
+def llm_stats() -> Optional[Dict]:
+    return _summarizer.llm.stats() if _summarizer is not None else None
+
+folding_sessions = set()
+folding_lock = threading.Lock()
+
+# Answers to repeated questions per document (exact or near-duplicate)
+answer_cache = AnswerCache()
+
+# State shared between API workers (STATE_BACKEND): job progress and
+# cached session listings. Documents need no copy here; they are stored in
+# the database and the caches above read through to it.
+state = create_state()
+
+# Session listings are cached under the "sessions" version, which is bumped
+# whenever a session is created; the TTL only bounds stale entries' lifetime
+SESSIONS_CACHE_TTL = float(os.getenv("SESSIONS_CACHE_TTL", "300"))
+
+def sessions_changed():
+    state.bump("sessions")
+
+# Background summarization jobs (JOB_WORKERS threads, JOB_QUEUE_SIZE pending)
+job_queue = JobQueue(state=state)
+
+# Bulk ingestion for /summarize/batch; extraction shares the process pool
+def get_ingester() -> BatchIngester:
+    global _ingester
+    if _ingester is None:
+        with _lazy_lock:
+            if _ingester is None:
+                _ingester = BatchIngester(db, get_summarizer(), pool=get_process_pool(), on_commit=sessions_changed)
+    return _ingester
+
+def all_cache_stats() -> Dict[str, Dict]:
+    return {
+        "documents": document_cache.stats(),
+        "answers": answer_cache.stats(),
+        "session_documents": session_documents.stats(),
+    }
+
+# Read at scrape time; cache counters and queue depth live in their objects
+metrics.Gauge("cache_items", "Entries held by each in-memory cache", ("cache",),
+              lambda: {(name,): stats["items"] for name, stats in all_cache_stats().items()})
+metrics.Gauge("cache_hit_ratio", "Hits over lookups since startup", ("cache",),
+              lambda: {(name,): stats["hit_ratio"] for name, stats in all_cache_stats().items()})
+metrics.Gauge("cache_evictions", "Entries evicted or expired since startup", ("cache",),
+              lambda: {(name,): stats["evictions"] for name, stats in all_cache_stats().items()})
+metrics.Gauge("shared_state_hit_ratio", "Hits over lookups in the shared state since startup", ("backend",),
+              lambda: {(state.stats()["backend"],): state.stats()["hit_ratio"]})
+metrics.Gauge("job_queue_depth", "Summarization jobs waiting for a worker", (),
+              lambda: {(): job_queue.depth()})
+metrics.Gauge("llm_in_flight", "Distinct prompts currently being generated", (),
+              lambda: {(): llm_stats()["in_flight"]} if llm_stats() else {})
 
-# Simple in-memory cache for sessions endpoint
-sessions_cache = {
-    "data": None,
-    "timestamp": 0
-}
-CACHE_TIMEOUT = 5  # 5 seconds
+# Optional sampling profiler (PROFILE_SAMPLING=true) for one-off captures
+profiler = profiler_from_env()
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject oversized uploads from Content-Length before the body is read"""
+    length = request.headers.get("content-length")
+    limit = MAX_BATCH_UPLOAD_BYTES if request.url.path == "/summarize/batch" else MAX_UPLOAD_BYTES
+    if request.url.path.startswith("/summarize") and length and length.isdigit() and int(length) > limit:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Upload exceeds the {limit // (1024 * 1024)} MB limit"}
+        )
+    return await call_next(request)
+
+@app.middleware("http")
+async def instrument(request: Request, call_next):
+    """Time each request for /metrics and report its stages in Server-Timing"""
+    timings = metrics.start_request()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = request.scope.get("route")
+    metrics.HTTP_REQUEST_SECONDS.observe(
+        elapsed,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=response.status_code
+    )
+    response.headers["Server-Timing"] = metrics.server_timing(timings, elapsed)
+    return response
+
+def warm_up():
+    """Load the summarizer and the model ahead of the first request (startup thread)"""
+    started = time.perf_counter()
+    try:
+        get_summarizer().warm_up()
+        print(f"Warm-up finished in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        print(f"Error warming up: {e}")
+
+def on_startup():
+    if profiler is not None:
+        profiler.start()
+    if os.getenv("WARMUP", "false").lower() == "true":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+def on_shutdown():
+    if profiler is not None:
+        profiler.stop()
+    shutdown_executors()
+    if _summarizer is not None:
+        _summarizer.llm.close()
+    state.close()
+
+def attach_document(session_id: str, pdf_name: str, document: Dict) -> Dict:
+    """
+    Add a processed document to a session, creating the session if needed,
+    and post its summary. Documents are referenced by hash, never copied.
+    """
+    summary = document["summary"]
+    if db.create_session(session_id, pdf_name, document["doc_id"]):
+        # Add summary as first message in chat
+        db.add_message(session_id, "assistant", f"PDF Summary: {summary}")
+        sessions_changed()
+    elif db.add_session_document(session_id, document["doc_id"], pdf_name):
+        db.add_message(session_id, "assistant", f"PDF Summary ({pdf_name}): {summary}")
+        state.bump(f"documents:{session_id}")
+    
+    return {
+        "session_id": session_id,
+        "summary": summary,
+        "documents": db.get_session_documents(session_id)
+    }
+
+def process_document(job: Job, path: str, doc_id: str, session_id: str, pdf_name: str) -> Dict:
+    """Extract, summarize and index a spooled upload (runs on a job worker thread)"""
+    # Parse the PDF once, page by page; chunks are mapped while later
+    # pages are still being extracted (large files fan out to the process pool)
+    job.update("extracting")
+    try:
+        pages = PageStream(path, pool=get_process_pool(), workers=PDF_WORKERS)
+        summary = get_summarizer().summarize_pages(pages, on_progress=job.update)
+    finally:
+        remove_spool(path)
+    # Mapping overlaps extraction, so "map" time includes waiting on pages
+    metrics.STAGE_SECONDS.observe(pages.seconds, stage="extract")
+    text = pages.text
+    
+    # Store summary and retrieval index for future reference
+    job.update("indexing")
+    index = get_summarizer().build_index(text, pages.pages)
+    document = {
+        "doc_id": doc_id,
+        "text": text,
+        "summary": summary,
+        "index": index
+    }
+    
+    # Persist the document so the session survives a backend restart
+    db.save_document(doc_id, text, index.to_dict(), summary, pages.page_count, pages.seconds)
+    document_cache.put(doc_id, document)
+    
+    return attach_document(session_id, pdf_name, document)
 
 @app.post("/summarize")
 async def summarize_pdf(
     file: UploadFile = File(...), 
     session_id: Optional[str] = Form(None),
+    priority: int = Form(10),
     api_key: str = Depends(get_api_key)
 ):
     """
-    Upload and summarize a PDF file
+    Upload a PDF file and queue it for summarization.
+    Poll /jobs/{job_id} for progress and the final summary.
     """
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
-    # Read file content
-    content = await file.read()
+    # Stream the upload to disk, hashing it on the way
+    try:
+        with metrics.stage("spool"):
+            path, doc_id = await spool_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
     # Generate session ID if not provided
     if not session_id:
         session_id = str(uuid.uuid4())
     
-    # Create session in database
-    db.create_session(session_id, file.filename)
+    # Reuse the summary if these exact bytes were processed before
+    document = await run_blocking(document_cache.get, doc_id)
     
+    if document is not None:
+        remove_spool(path)
+        result = await run_blocking(attach_document, session_id, file.filename, document)
+        job = job_queue.add_finished(result, session_id)
+    else:
+        try:
+            job = job_queue.submit(
+                lambda job: process_document(job, path, doc_id, session_id, file.filename),
+                priority=priority,
+                session_id=session_id
+            )
+        except QueueFullError as e:
+            remove_spool(path)
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    
+    return job.to_dict()
+
+def ingest_batch(job: Job, files: List[tuple]) -> Dict:
+    """Ingest spooled batch files, then delete them (runs on a job worker thread)"""
     try:
-        # Generate summary
-        summary = summarizer.summarize(content)
-        
-        # Store summary for future reference
-        pdf_summaries[session_id] = {
-            "text": summarizer.extract_text_from_pdf(content),
-            "summary": summary
-        }
-        
-        # Add summary as first message in chat
-        db.add_message(session_id, "assistant", f"PDF Summary: {summary}")
+        return get_ingester().ingest(files, on_progress=job.update)
+    finally:
+        for _, path in files:
+            remove_spool(path)
+
+@app.post("/summarize/batch")
+async def summarize_batch(
+    files: List[UploadFile] = File(...),
+    priority: int = Form(20),
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Upload many PDFs, or zip archives of PDFs, as one background job.
+    Each file gets its own session; the job result is a per-file report.
+    """
+    spooled = []
+    spooled_bytes = 0  # across every file and archive member in the request
+    try:
+        for file in files:
+            name = file.filename or ""
+            is_zip = name.lower().endswith(".zip")
+            if not is_zip and not name.lower().endswith(".pdf"):
+                raise HTTPException(status_code=400, detail=f"{name}: only PDF and zip files are supported")
+            try:
+                path, _ = await spool_upload(file, MAX_BATCH_UPLOAD_BYTES if is_zip else MAX_UPLOAD_BYTES)
+                if is_zip:
+                    try:
+                        members = await run_blocking(
+                            spool_zip, path, MAX_UPLOAD_BYTES, MAX_BATCH_EXTRACTED_BYTES - spooled_bytes
+                        )
+                    finally:
+                        remove_spool(path)
+                else:
+                    members = [(name, path)]
+                spooled.extend(members)
+                spooled_bytes += sum(os.path.getsize(member_path) for _, member_path in members)
+                if spooled_bytes > MAX_BATCH_EXTRACTED_BYTES:
+                    raise UploadTooLargeError(
+                        f"Batch PDFs exceed the {MAX_BATCH_EXTRACTED_BYTES // (1024 * 1024)} MB limit"
+                    )
+                if len(spooled) > MAX_BATCH_FILES:
+                    raise UploadTooLargeError(f"Batch has more than {MAX_BATCH_FILES} PDFs")
+            except UploadTooLargeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{name}: not a valid zip archive")
+        if not spooled:
+            raise HTTPException(status_code=400, detail="No PDF files in the upload")
         
-        return {
-            "session_id": session_id,
-            "summary": summary
-        }
+        try:
+            job = job_queue.submit(lambda job: ingest_batch(job, spooled), priority=priority)
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except BaseException:
+        for _, path in spooled:
+            remove_spool(path)
+        raise
+    
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Get the stage, progress, partial results and ETA of a summarization job
+    """
+    job = await run_blocking(job_queue.lookup, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def fold_conversation(session_id: str, summary: str, messages: List[Dict]):
+    """Fold older messages into the session's rolling summary (runs on an LLM thread)"""
+    with folding_lock:
+        if session_id in folding_sessions:
+            return
+        folding_sessions.add(session_id)
+    try:
+        new_summary = get_memory().fold(summary, messages)
+        db.save_conversation_summary(session_id, new_summary, messages[-1]["id"])
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+        print(f"Error summarizing conversation: {e}")
+    finally:
+        with folding_lock:
+            folding_sessions.discard(session_id)
+
+async def prepare_chat(session_id: str, user_message: str):
+    """
+    Record the user message and gather what the reply needs: retrieved
+    context, recent messages, the rolling summary of earlier ones, and the
+    messages still to be folded into that summary.
+    """
+    # Check if session exists, loading it from the document store if needed
+    document = await run_blocking(get_session_document, session_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Session not found. Please upload a PDF first.")
+    
+    # Add user message to history
+    await adb.add_message(session_id, "user", user_message)
+    
+    # Get recent chat history; older turns are covered by the rolling summary
+    memory_state = await adb.get_conversation_summary(session_id)
+    messages = await adb.get_messages_after(session_id, memory_state["last_message_id"])
+    to_fold, chat_history = get_memory().split(messages)
+    
+    # Use only the chunks relevant to this question
+    context = await run_blocking(get_summarizer().retrieve_context, user_message, document["index"])
+    
+    return context, chat_history, memory_state["summary"], to_fold, document["doc_id"]
 
 @app.post("/chat")
 async def chat(
@@ -93,58 +516,237 @@ async def chat(
     session_id = request.session_id
     user_message = request.message
     
-    # Check if session exists
-    if session_id not in pdf_summaries:
-        raise HTTPException(status_code=404, detail="Session not found. Please upload a PDF first.")
+    context, chat_history, conversation_summary, to_fold, doc_id = await prepare_chat(session_id, user_message)
     
-    # Add user message to history
-    db.add_message(session_id, "user", user_message)
-    
-    # Get chat history
-    chat_history = db.get_session_messages(session_id)
+    # Answer repeated questions about the same document from the cache
+    cached = answer_cache.lookup(doc_id, user_message, context) if request.use_cache and doc_id else None
+    if cached is not None:
+        await adb.add_message(session_id, "assistant", cached)
+        return {"response": cached, "cached": True}
     
     # Generate response
-    context = pdf_summaries[session_id]["text"]
-    response = summarizer.chat(user_message, context, chat_history)
+    response = await run_llm(get_summarizer().chat, user_message, context, chat_history, conversation_summary)
+    if doc_id:
+        answer_cache.store(doc_id, user_message, response, context)
     
     # Add assistant response to history
-    db.add_message(session_id, "assistant", response)
+    await adb.add_message(session_id, "assistant", response)
+    
+    # Update the rolling summary after replying, off the request path
+    if to_fold:
+        get_llm_pool().submit(fold_conversation, session_id, conversation_summary, to_fold)
     
     return {
-        "response": response
+        "response": response,
+        "cached": False
     }
 
+def sse_event(data: Dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Chat with the bot, streaming the response as Server-Sent Events.
+    Each token is sent as `data: {"token": ...}`, followed by an `event: done`
+    (or `event: error`) message. The reply is saved once the stream ends,
+    including when the client disconnects part way through.
+    """
+    session_id = request.session_id
+    user_message = request.message
+    
+    context, chat_history, conversation_summary, to_fold, doc_id = await prepare_chat(session_id, user_message)
+    
+    # A cached answer is sent as a single token
+    cached = answer_cache.lookup(doc_id, user_message, context) if request.use_cache and doc_id else None
+    
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        cancelled = threading.Event()
+        
+        def emit(kind: str, value: str):
+            try:
+                loop.call_soon_threadsafe(events.put_nowait, (kind, value))
+            except RuntimeError:
+                # Event loop already closed
+                cancelled.set()
+        
+        def produce():
+            # Runs on an LLM thread; owns the reply so it is saved even if the client disconnects
+            response = ""
+            if cached is not None:
+                tokens = iter([cached])
+            else:
+                tokens = get_summarizer().chat_stream(user_message, context, chat_history, conversation_summary)
+            try:
+                for token in tokens:
+                    if cancelled.is_set():
+                        break
+                    response += token
+                    emit("token", token)
+                else:
+                    if cached is None and doc_id:
+                        answer_cache.store(doc_id, user_message, response, context)
+                emit("done", response)
+            except Exception as e:
+                emit("error", str(e))
+            finally:
+                if hasattr(tokens, "close"):
+                    tokens.close()
+                if response:
+                    db.add_message(session_id, "assistant", response)
+                if to_fold:
+                    fold_conversation(session_id, conversation_summary, to_fold)
+        
+        get_llm_pool().submit(produce)
+        try:
+            while True:
+                kind, value = await events.get()
+                if kind == "token":
+                    yield sse_event({"token": value})
+                elif kind == "done":
+                    yield sse_event({"response": value}, event="done")
+                    break
+                else:
+                    yield sse_event({"detail": value}, event="error")
+                    break
+        finally:
+            cancelled.set()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def etag_response(request: Request, payload: Dict) -> Response:
+    """JSON response with an ETag; 304 Not Modified if the client already has it"""
+    body = json.dumps(payload, default=str).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
 @app.get("/sessions")
-async def get_sessions(api_key: str = Depends(get_api_key), request: Request = None):
+async def get_sessions(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    after: Optional[str] = None,
+    since: Optional[str] = None,
+    search: Optional[str] = None,
+    api_key: str = Depends(get_api_key)
+):
     """
-    Get all chat sessions with caching to reduce database load
+    Get one page of chat sessions, newest first.
+    Pass `next_cursor` back as `after` for the next page, `since` (a
+    created_at timestamp) to fetch only newer sessions, and `search` to
+    filter by PDF name. Pages are cached until a session is created.
     """
-    current_time = time.time()
+    # Entries from before the last new session are simply never looked up again
+    version = await run_blocking(state.version, "sessions")
+    cache_key = json.dumps([version, limit, after, since, search])
     
-    # Return cached data if it's still fresh
-    if sessions_cache["data"] and current_time - sessions_cache["timestamp"] < CACHE_TIMEOUT:
-        return sessions_cache["data"]
+    cached = await run_blocking(state.get, "sessions", cache_key)
+    if cached is not None:
+        return etag_response(request, cached)
     
     # Otherwise, fetch from database
-    sessions = db.get_all_sessions()
-    result = {"sessions": sessions}
+    try:
+        sessions, next_cursor = await adb.list_sessions(limit, after, since, search)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = {"sessions": sessions, "next_cursor": next_cursor}
     
     # Update cache
-    sessions_cache["data"] = result
-    sessions_cache["timestamp"] = current_time
+    await run_blocking(state.set, "sessions", cache_key, result, SESSIONS_CACHE_TTL)
     
-    return result
+    return etag_response(request, result)
+
+@app.get("/sessions/{session_id}/documents")
+async def get_session_documents(
+    session_id: str,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    List the documents attached to a session, in the order they were added
+    """
+    session = await adb.get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_id": session_id, "documents": await adb.get_session_documents(session_id)}
+
+@app.post("/sessions/{session_id}/documents")
+async def add_session_document(
+    session_id: str,
+    request: AttachDocumentRequest,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Attach an already processed document (by its SHA-256 doc_id) to a
+    session, creating the session if needed. Nothing is re-extracted or
+    re-indexed; to add a new PDF, upload it to /summarize with this
+    session_id instead.
+    """
+    document = await run_blocking(document_cache.get, request.doc_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    pdf_name = request.pdf_name or await adb.get_document_name(request.doc_id)
+    return await run_blocking(attach_document, session_id, pdf_name, document)
+
+@app.get("/search")
+async def search(
+    q: str,
+    scope: str = Query("all", pattern="^(all|messages|documents)$"),
+    session_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Full-text search across chat messages and document text, best match first.
+    `scope` limits results to "messages" or "documents" and `session_id` to
+    one session. Snippets mark matches with <mark>; document matches carry
+    the `page` and `end_page` of their chunk (null for documents indexed
+    before page spans were recorded). Pass `next_cursor` back as `after`
+    for the next page.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty search query")
+    try:
+        results, next_cursor = await adb.search(q, scope, session_id, limit, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results, "next_cursor": next_cursor}
 
 @app.get("/history/{session_id}")
 async def get_chat_history(
     session_id: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    after: Optional[str] = None,
+    since: Optional[str] = None,
     api_key: str = Depends(get_api_key)
 ):
     """
-    Get chat history for a specific session
+    Get chat history for a specific session, oldest first.
+    Without `limit` the whole history is returned; with it, pass
+    `next_cursor` back as `after` for the next page. `since` returns only
+    messages newer than that timestamp.
     """
-    messages = db.get_session_messages(session_id)
-    return {"session_id": session_id, "messages": messages}
+    if limit is None and after is None and since is None:
+        messages, next_cursor = await adb.get_session_messages(session_id), None
+    else:
+        try:
+            messages, next_cursor = await adb.list_messages(session_id, limit or 1000, after, since)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return etag_response(request, {"session_id": session_id, "messages": messages, "next_cursor": next_cursor})
 
 @app.get("/reload_session/{session_id}")
 async def reload_session(
@@ -154,31 +756,46 @@ async def reload_session(
     """
     Reload a session's PDF data into memory
     """
-    # Check if session exists in database
-    sessions = db.get_all_sessions()
-    session = next((s for s in sessions if s["session_id"] == session_id), None)
+    # Look up the session and its document metadata
+    session = await adb.get_session(session_id)
     
     if not session:
         raise HTTPException(status_code=404, detail="Session not found in database")
     
-    # Get chat history to find the summary
-    messages = db.get_session_messages(session_id)
-    
-    # Find the summary message (first assistant message)
-    summary = None
-    for msg in messages:
-        if msg["role"] == "assistant" and "PDF Summary:" in msg["content"]:
-            summary = msg["content"].replace("PDF Summary: ", "")
-            break
+    # Restore the stored documents (or, for old sessions, the summary);
+    # no PDF parsing or LLM work needed
+    if await run_blocking(get_session_document, session_id) is None:
+        raise HTTPException(status_code=404, detail="Could not find PDF summary for this session")
     
-    if not summary:
-        raise HTTPException(status_code=404, detail="Could not find PDF summary in chat history")
-    
-    # Add to pdf_summaries with empty text (we don't have the original text anymore)
-    # This is enough to allow chat to work
-    pdf_summaries[session_id] = {
-        "text": "PDF text not available for reloaded sessions",
-        "summary": summary
+    documents = await adb.get_session_documents(session_id)
+    return {"success": True, "session_id": session_id, "session": session, "documents": documents}
+
+@app.get("/cache_stats")
+async def cache_stats(api_key: str = Depends(get_api_key)):
+    """
+    Hit, miss and eviction counters for the in-memory caches
+    """
+    return {
+        **all_cache_stats(),
+        "state": state.stats(),
+        "llm": llm_stats()
     }
-    
-    return {"success": True, "session_id": session_id} 
\ No newline at end of file
+
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness check that answers as soon as the app is up, before the
+    summarizer and model are loaded; `ready` tells whether they are
+    """
+    return {"status": "ok", "ready": _summarizer is not None}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(
+    api_key: Optional[str] = Depends(get_metrics_api_key)
+):
+    """
+    Stage timings, LLM calls and tokens, DB query latency, cache ratios and
+    queue depth in the Prometheus text format. Requires the API key unless
+    METRICS_PUBLIC=true.
+    """
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,167 @@
+import hashlib
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from chunking import TokenCounter, get_token_counter
+from metrics import MAP_MEMO_LOOKUPS, stage
+
+# Same wording as LangChain's default map_reduce summarize prompt
+SUMMARY_PROMPT = """Write a concise summary of the following:
+
+
+"{text}"
+
+
+CONCISE SUMMARY:"""
+
+def prompt_budget(context_tokens: int, counter: TokenCounter = None) -> int:
+    """
+    Tokens of text one SUMMARY_PROMPT call can take: a fraction
+    (CHUNK_CONTEXT_FRACTION) of the model's context, less the prompt itself.
+    The rest is left for the summary it generates.
+    """
+    counter = counter or get_token_counter()
+    return int(context_tokens * float(os.getenv("CHUNK_CONTEXT_FRACTION", "0.5"))) - counter.count(SUMMARY_PROMPT)
+
+# Part of every memo key, so editing the prompt invalidates stored map results
+PROMPT_VERSION = hashlib.sha256(SUMMARY_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+class MapReduceSummarizer:
+    """
+    Map-reduce summarization with a concurrent map step.
+
+    Chunks are summarized by up to `max_workers` parallel LLM calls, then the
+    partial summaries are collapsed in batches of at most `context_tokens`
+    tokens (by default the prompt budget of `llm.context_tokens`, counted
+    with `counter`) until a single final summary remains. `llm` only needs
+    an `invoke(prompt) -> str` method, and `context_tokens` when no budget
+    is given.
+
+    `on_progress(stage, done, total, partial)` is called after every LLM
+    call with stage "mapping" or "reducing" and the new partial summary.
+
+    With a `memo` (any object with `get_map_summary(key)` and
+    `save_map_summary(key, summary)`, such as ChatDatabase), each chunk's
+    map summary is stored under a hash of its text, `model` and the prompt,
+    so re-summarizing a revised document only maps the changed chunks.
+    """
+
+    def __init__(self, llm, max_workers: int = None, context_tokens: int = None,
+                 memo=None, model: str = "", counter: TokenCounter = None):
+        self.llm = llm
+        self.counter = counter or get_token_counter()
+        self.memo = memo
+        self.model = model
+        self.max_workers = max_workers or int(
+            os.getenv("SUMMARY_MAP_WORKERS", os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+        )
+        self.context_tokens = context_tokens or prompt_budget(llm.context_tokens, self.counter)
+
+    def _summarize_text(self, text: str) -> str:
+        return str(self.llm.invoke(SUMMARY_PROMPT.format(text=text))).strip()
+
+    def memo_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{PROMPT_VERSION}\0{text}".encode("utf-8")).hexdigest()
+
+    def _recall(self, text: str) -> Tuple[str, Optional[str]]:
+        """Memo key of a chunk and its stored summary, if it was mapped before"""
+        key = self.memo_key(text)
+        summary = self.memo.get_map_summary(key)
+        MAP_MEMO_LOOKUPS.inc(result="hit" if summary is not None else "miss")
+        return key, summary
+
+    def _map(self, texts: Iterable[str], stage: str = "mapping", on_progress: Optional[Callable] = None) -> List[str]:
+        """
+        Summarize each text, keeping input order. `texts` may be a lazy
+        iterator; calls start as soon as each text is produced.
+
+        Memo lookups and saves run on the calling thread, so the map
+        threads (a new pool per call) never open database connections.
+        """
+        memoize = stage == "mapping" and self.memo is not None
+        if self.max_workers <= 1:
+            results = []
+            for text in texts:
+                key, summary = self._recall(text) if memoize else (None, None)
+                if summary is None:
+                    summary = self._summarize_text(text)
+                    if key is not None:
+                        self.memo.save_map_summary(key, summary)
+                results.append(summary)
+                if on_progress:
+                    on_progress(stage, len(results), len(results), results[-1])
+            return results
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = []
+            keys = []  # memo key of each text mapped by this call, None for stored summaries
+            done = 0
+
+            def finish(i: int):
+                summary = futures[i].result()
+                if keys[i] is not None:
+                    self.memo.save_map_summary(keys[i], summary)
+                if on_progress:
+                    on_progress(stage, i + 1, len(futures), summary)
+
+            for text in texts:
+                key, summary = self._recall(text) if memoize else (None, None)
+                if summary is None:
+                    futures.append(pool.submit(self._summarize_text, text))
+                else:
+                    key = None
+                    futures.append(Future())
+                    futures[-1].set_result(summary)
+                keys.append(key)
+                # Report calls that finished while later input was being produced
+                while done < len(futures) and futures[done].done():
+                    finish(done)
+                    done += 1
+            while done < len(futures):
+                finish(done)
+                done += 1
+            return [future.result() for future in futures]
+
+    def _batch(self, summaries: List[str]) -> List[str]:
+        """Group summaries into combined texts that each fit the context window"""
+        batches = []
+        current = []
+        used = 0
+        # The "\n\n" between summaries is counted as a token of its own
+        for summary, tokens in zip(summaries, self.counter.count_many(summaries)):
+            cost = tokens + 1
+            if current and used + cost > self.context_tokens:
+                batches.append("\n\n".join(current))
+                current = []
+                used = 0
+            current.append(summary)
+            used += cost
+        if current:
+            batches.append("\n\n".join(current))
+        return batches
+
+    def reduce(self, summaries: List[str], on_progress: Optional[Callable] = None) -> str:
+        """Collapse partial summaries level by level into one summary"""
+        batches = self._batch(summaries)
+        while len(batches) > 1:
+            collapsed = self._map(batches, "reducing", on_progress)
+            next_batches = self._batch(collapsed)
+            if len(next_batches) >= len(batches):
+                # Summaries are not shrinking; combine pairwise to guarantee progress
+                next_batches = [
+                    "\n\n".join(collapsed[i:i + 2]) for i in range(0, len(collapsed), 2)
+                ]
+            batches = next_batches
+        if not batches:
+            return ""
+        summary = self._summarize_text(batches[0])
+        if on_progress:
+            on_progress("reducing", 1, 1, None)
+        return summary
+
+    def summarize(self, chunks: Iterable[str], on_progress: Optional[Callable] = None) -> str:
+        with stage("map"):
+            summaries = self._map(chunks, "mapping", on_progress)
+        with stage("reduce"):
+            return self.reduce(summaries, on_progress)
@@ -0,0 +1,66 @@
+import os
+from typing import Any, Dict, List, Tuple
+
+from chunking import TokenCounter, get_token_counter
+
+# Same wording as LangChain's ConversationSummaryMemory prompt
+FOLD_PROMPT = """Progressively summarize the lines of conversation provided, adding onto the previous summary returning a new summary.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
+class ConversationMemory:
+    """
+    Bounded chat history for prompt construction.
+
+    The newest messages are kept verbatim, up to `max_messages` and
+    `token_budget`; anything older is folded into a rolling summary,
+    a batch at a time, so per-turn prompt size stays flat however long
+    the conversation runs. `llm` only needs an `invoke(prompt) -> str` method.
+    """
+
+    def __init__(self, llm, max_messages: int = None, token_budget: int = None, counter: TokenCounter = None):
+        self.llm = llm
+        self.counter = counter or get_token_counter()
+        self.max_messages = max_messages or int(os.getenv("MEMORY_MAX_MESSAGES", "6"))
+        self.token_budget = token_budget or int(os.getenv("MEMORY_TOKEN_BUDGET", "800"))
+
+    def split(self, messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Split messages (oldest first) into (to fold, to keep verbatim)"""
+        used = 0
+        keep = 0
+        for message in reversed(messages):
+            cost = self.counter.count(message["content"])
+            if keep >= self.max_messages or (keep and used + cost > self.token_budget):
+                break
+            used += cost
+            keep += 1
+        cut = len(messages) - keep
+        return messages[:cut], messages[cut:]
+
+    def fold(self, summary: str, messages: List[Dict[str, Any]]) -> str:
+        """Fold messages into the rolling summary, in batches that fit the token budget"""
+        batch = []
+        used = 0
+        for message in messages:
+            line = f"{message['role']}: {message['content']}"
+            cost = self.counter.count(line)
+            if batch and used + cost > self.token_budget * 2:
+                summary = self._fold_batch(summary, batch)
+                batch = []
+                used = 0
+            # A single huge message is truncated rather than blowing the context
+            batch.append(self.counter.truncate(line, self.token_budget * 2))
+            used += min(cost, self.token_budget * 2)
+        if batch:
+            summary = self._fold_batch(summary, batch)
+        return summary
+
+    def _fold_batch(self, summary: str, lines: List[str]) -> str:
+        prompt = FOLD_PROMPT.format(summary=summary or "(none)", new_lines="\n".join(lines))
+        return str(self.llm.invoke(prompt)).strip()
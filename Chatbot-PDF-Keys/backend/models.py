@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -23,4 +23,10 @@ class SummarizeRequest(BaseModel):
 
 class ChatRequest(BaseModel):
     session_id: str
-    message: str 
\ No newline at end of file
+    message: str
+    use_cache: bool = True
+
+class AttachDocumentRequest(BaseModel):
+    # SHA-256 of the stored PDF, as returned by /summarize
+    doc_id: str = Field(pattern="^[0-9a-f]{64}$")
+    pdf_name: Optional[str] = None
@@ -0,0 +1,75 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for one-off captures in a running server.
+
+    A background thread records the stack of every other thread each
+    `interval` seconds. `stop()` writes the samples to `output` in collapsed
+    stack format ("outer;inner;leaf count" per line), which flamegraph.pl
+    and speedscope read directly.
+    """
+
+    def __init__(self, interval: float = 0.01, output: str = "profile.folded", duration: Optional[float] = None):
+        self.interval = interval
+        self.output = output
+        self.duration = duration
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.duration if self.duration else None
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                self._write()
+                return
+
+    def _write(self):
+        with open(self.output, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"Wrote {sum(self.samples.values())} profile samples to {self.output}")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        finished = not self._thread.is_alive()
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if not finished:
+            self._write()
+
+def profiler_from_env() -> Optional[SamplingProfiler]:
+    """
+    Profiler configured by PROFILE_SAMPLING=true, or None when it is off.
+    PROFILE_SECONDS limits the capture (default: until shutdown).
+    """
+    if os.getenv("PROFILE_SAMPLING", "false").lower() != "true":
+        return None
+    return SamplingProfiler(
+        interval=float(os.getenv("PROFILE_INTERVAL_MS", "10")) / 1000,
+        output=os.getenv("PROFILE_OUTPUT", "profile.folded"),
+        duration=float(os.getenv("PROFILE_SECONDS", "0")) or None
+    )
@@ -0,0 +1,215 @@
+import math
+import re
+import sys
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+from chunking import get_token_counter
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens used for lexical scoring"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class BM25Scorer:
+    """Deterministic local fallback scorer used when no embedder is configured"""
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.doc_freqs = Counter()
+        for tf in self.term_freqs:
+            self.doc_freqs.update(tf.keys())
+        self.idf = {
+            term: _idf(len(chunks), df)
+            for term, df in self.doc_freqs.items()
+        }
+
+    def score(self, query: str, idf: Optional[Dict[str, float]] = None,
+              avg_length: Optional[float] = None) -> List[float]:
+        """
+        BM25 score of every chunk. `idf` and `avg_length` override this
+        corpus' statistics, so scores from several corpora can be compared.
+        """
+        idf = self.idf if idf is None else idf
+        avg_length = self.avg_length if avg_length is None else avg_length
+        terms = set(tokenize(query))
+        scores = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (avg_length or 1))
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term)
+                if freq:
+                    score += idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+
+class DocumentIndex:
+    """
+    Per-session retrieval index over the chunks of one document.
+
+    `embedder` is any object exposing `embed_documents(texts)` and
+    `embed_query(text)` (the LangChain Embeddings interface). Without one,
+    chunks are ranked with BM25. `pages` holds each chunk's (first page,
+    last page) when known; retrieved passages then cite them.
+    """
+
+    def __init__(self, chunks: List[str], embedder=None, embeddings: Optional[List[List[float]]] = None,
+                 pages: Optional[List[Tuple[int, int]]] = None):
+        self.chunks = chunks
+        self.pages = [tuple(span) for span in pages] if pages is not None else None
+        self.embedder = embedder
+        self.embeddings = embeddings
+        if embedder is not None and embeddings is None and chunks:
+            self.embeddings = embedder.embed_documents(chunks)
+        self.bm25 = BM25Scorer(chunks) if self.embeddings is None else None
+
+    def has_embeddings(self) -> bool:
+        return self.embeddings is not None and self.embedder is not None
+
+    def scorer(self) -> BM25Scorer:
+        if self.bm25 is None:
+            self.bm25 = BM25Scorer(self.chunks)
+        return self.bm25
+
+    def _scores(self, query: str) -> List[float]:
+        if self.has_embeddings():
+            query_vector = self.embedder.embed_query(query)
+            return [_cosine(query_vector, vector) for vector in self.embeddings]
+        return self.scorer().score(query)
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[int, float]]:
+        """Return (chunk position, score) pairs for the best matching chunks"""
+        scores = self._scores(query)
+        ranked = sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+        return [(i, scores[i]) for i in ranked[:top_k]]
+
+    def page_label(self, position: int) -> Optional[str]:
+        """A chunk's pages as "page 3" or "pages 3-4"; None when they are unknown"""
+        if self.pages is None:
+            return None
+        page, end_page = self.pages[position]
+        return f"page {page}" if page == end_page else f"pages {page}-{end_page}"
+
+    def passage(self, position: int) -> str:
+        """A chunk headed by its pages, as it goes into the chat prompt"""
+        label = self.page_label(position)
+        return f"[{label.capitalize()}]\n{self.chunks[position]}" if label else self.chunks[position]
+
+    def retrieve(self, query: str, top_k: int = 4, token_budget: int = 1500) -> List[str]:
+        """Top-k chunks that fit in the token budget, in document order, tagged with their pages"""
+        ranked = [(position, self.passage(position)) for position, _ in self.search(query, top_k)]
+        selected = _fit_budget(ranked, token_budget)
+        if not selected and self.chunks:
+            selected.append((0, get_token_counter().truncate(self.passage(0), token_budget)))
+        return [chunk for _, chunk in sorted(selected)]
+
+    def nbytes(self) -> int:
+        """Approximate memory used by the chunks and scoring data"""
+        size = sum(sys.getsizeof(chunk) for chunk in self.chunks)
+        if self.embeddings is not None:
+            size += sum(len(vector) for vector in self.embeddings) * 32
+        if self.bm25 is not None:
+            # Dict entry plus int per term occurrence in each chunk
+            size += sum(len(tf) for tf in self.bm25.term_freqs) * 100 + len(self.bm25.idf) * 100
+        return size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"chunks": self.chunks, "embeddings": self.embeddings, "pages": self.pages}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], embedder=None) -> "DocumentIndex":
+        embeddings = data.get("embeddings") if embedder is not None else None
+        # Indexes stored before page spans were recorded have none
+        return cls(data["chunks"], embedder=embedder, embeddings=embeddings, pages=data.get("pages"))
+
+class SessionIndex:
+    """
+    Retrieval across the documents of one session.
+
+    Wraps each document's own index, as (source name, DocumentIndex) pairs,
+    so those stay shared with every other session using the document and
+    adding one to a session indexes nothing again. BM25 statistics are
+    summed over all the documents at query time, which keeps scores
+    comparable between them. Returned passages are tagged with their source.
+    """
+
+    def __init__(self, sources: List[Tuple[str, DocumentIndex]]):
+        self.sources = sources
+
+    def _scores(self, query: str) -> List[List[float]]:
+        indexes = [index for _, index in self.sources]
+        if all(index.has_embeddings() for index in indexes):
+            query_vector = indexes[0].embedder.embed_query(query)
+            return [[_cosine(query_vector, vector) for vector in index.embeddings] for index in indexes]
+        scorers = [index.scorer() for index in indexes]
+        chunks = sum(len(scorer.lengths) for scorer in scorers)
+        avg_length = sum(sum(scorer.lengths) for scorer in scorers) / (chunks or 1)
+        idf = {
+            term: _idf(chunks, sum(scorer.doc_freqs.get(term, 0) for scorer in scorers))
+            for term in set(tokenize(query))
+        }
+        return [scorer.score(query, idf=idf, avg_length=avg_length) for scorer in scorers]
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[int, int, float]]:
+        """
+        (source, chunk position, score) of the best matches overall. Each
+        source that matches at all contributes its best chunk first, so a
+        comparison question sees every document.
+        """
+        ranked = sorted(
+            ((source, position, score)
+             for source, scores in enumerate(self._scores(query))
+             for position, score in enumerate(scores)),
+            key=lambda match: (-match[2], match[0], match[1])
+        )
+        best = {}
+        for match in ranked:
+            if match[2] > 0 and match[0] not in best:
+                best[match[0]] = match
+        first = list(best.values())[:top_k]
+        rest = [match for match in ranked if match not in first]
+        return first + rest[:top_k - len(first)]
+
+    def retrieve(self, query: str, top_k: int = 4, token_budget: int = 1500) -> List[str]:
+        """Top-k passages that fit in the token budget, grouped by source"""
+        ranked = [((source, position), self._passage(source, position)) for source, position, _ in self.search(query, top_k)]
+        return [chunk for _, chunk in sorted(_fit_budget(ranked, token_budget))]
+
+    def _passage(self, source: int, position: int) -> str:
+        name, index = self.sources[source]
+        label = index.page_label(position)
+        return f"[Source: {name}{', ' + label if label else ''}]\n{index.chunks[position]}"
+
+    def nbytes(self) -> int:
+        return sum(index.nbytes() for _, index in self.sources)
+
+def _idf(chunks: int, doc_freq: int) -> float:
+    return math.log(1 + (chunks - doc_freq + 0.5) / (doc_freq + 0.5))
+
+def _fit_budget(ranked: List[Tuple[Any, str]], token_budget: int) -> List[Tuple[Any, str]]:
+    """Take (key, chunk) pairs in rank order while they fit in the token budget"""
+    counter = get_token_counter()
+    selected = []
+    used = 0
+    for (key, chunk), cost in zip(ranked, counter.count_many([chunk for _, chunk in ranked])):
+        if selected and used + cost > token_budget:
+            continue
+        if not selected and cost > token_budget:
+            # Always return something; truncate an oversized best chunk
+            selected.append((key, counter.truncate(chunk, token_budget)))
+            used = token_budget
+            continue
+        selected.append((key, chunk))
+        used += cost
+    return selected
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
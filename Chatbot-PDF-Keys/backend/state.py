@@ -0,0 +1,217 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from cache import LRUCache
+
+class SharedState(ABC):
+    """
+    Key-value state shared by the API workers, plus change counters.
+
+    Values are JSON-serializable and stored per `namespace` with an
+    optional TTL. `bump(topic)` records that something changed (e.g. a
+    session was created); caches fold `version(topic)` into their keys, so
+    a bump invalidates every entry derived from that topic at once, in
+    every worker, without waiting for a timeout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @abstractmethod
+    def _read(self, namespace: str, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def _write(self, namespace: str, key: str, value: str, ttl: Optional[float]):
+        pass
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        pass
+
+    @abstractmethod
+    def version(self, topic: str) -> int:
+        pass
+
+    @abstractmethod
+    def bump(self, topic: str) -> int:
+        pass
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        value = self._read(namespace, key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return json.loads(value) if value is not None else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        self._write(namespace, key, json.dumps(value), ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": type(self).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self):
+        pass
+
+class LocalState(SharedState):
+    """In-process state for a single worker; entries are LRU-bounded per namespace"""
+
+    def __init__(self, max_items: int = 10000):
+        super().__init__()
+        self.max_items = max_items
+        self._namespaces: Dict[str, LRUCache] = {}
+        self._versions: Dict[str, int] = {}
+
+    def _namespace(self, namespace: str) -> LRUCache:
+        with self._lock:
+            if namespace not in self._namespaces:
+                self._namespaces[namespace] = LRUCache(max_items=self.max_items)
+            return self._namespaces[namespace]
+
+    def _read(self, namespace: str, key: str) -> Optional[str]:
+        entry = self._namespace(namespace).get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.time() > expires_at:
+            self.delete(namespace, key)
+            return None
+        return value
+
+    def _write(self, namespace: str, key: str, value: str, ttl: Optional[float]):
+        self._namespace(namespace).put(key, (value, time.time() + ttl if ttl else None))
+
+    def delete(self, namespace: str, key: str):
+        self._namespace(namespace).invalidate(key)
+
+    def version(self, topic: str) -> int:
+        with self._lock:
+            return self._versions.get(topic, 0)
+
+    def bump(self, topic: str) -> int:
+        with self._lock:
+            self._versions[topic] = self._versions.get(topic, 0) + 1
+            return self._versions[topic]
+
+class SQLiteState(SharedState):
+    """
+    State in a SQLite file that every worker on the host opens. WAL mode and
+    the memory-mapped page cache keep reads close to shared-memory speed;
+    expired rows are purged every `purge_every` writes.
+    """
+
+    def __init__(self, path: str = None, purge_every: int = 1000):
+        super().__init__()
+        self.path = path or os.getenv("STATE_PATH", "shared_state.db")
+        self.purge_every = purge_every
+        self._writes = 0
+        self._local = threading.local()
+        self._connections = []
+        conn = self._connection()
+        with conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            )
+            ''')
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS versions (
+                topic TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+            ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Only the owning thread queries it; other threads may close it
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute(f"PRAGMA mmap_size={64 * 1024 * 1024}")
+            self._local.conn = conn
+            with self._lock:
+                # Close the connections of threads that have exited
+                for thread, stale in self._connections:
+                    if not thread.is_alive():
+                        stale.close()
+                self._connections = [(thread, c) for thread, c in self._connections if thread.is_alive()]
+                self._connections.append((threading.current_thread(), conn))
+        return conn
+
+    def close(self):
+        with self._lock:
+            for _, conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def _read(self, namespace: str, key: str) -> Optional[str]:
+        row = self._connection().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time())
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def _write(self, namespace: str, key: str, value: str, ttl: Optional[float]):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, time.time() + ttl if ttl else None)
+            )
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+        if purge:
+            with conn:
+                conn.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def delete(self, namespace: str, key: str):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def version(self, topic: str) -> int:
+        row = self._connection().execute("SELECT version FROM versions WHERE topic = ?", (topic,)).fetchone()
+        return row[0] if row is not None else 0
+
+    def bump(self, topic: str) -> int:
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO versions (topic, version) VALUES (?, 1) "
+                "ON CONFLICT(topic) DO UPDATE SET version = version + 1",
+                (topic,)
+            )
+        return self.version(topic)
+
+def create_state() -> SharedState:
+    """Backend selected by STATE_BACKEND: "local" (default, one worker) or "sqlite" (several workers on a host)"""
+    backend = os.getenv("STATE_BACKEND", "local").lower()
+    if backend == "local":
+        return LocalState()
+    if backend == "sqlite":
+        return SQLiteState()
+    raise ValueError(f"Unknown STATE_BACKEND: {backend}")
@@ -1,63 +1,137 @@
-import io
-import PyPDF2
-from langchain.llms import Ollama
-from langchain.chains.summarize import load_summarize_chain
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.docstore.document import Document
-from typing import List, Dict, Any
+import os
+from bisect import bisect_right
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+from chunking import Chunk, PageChunker, get_token_counter
+from llm import create_llm
+from map_reduce import MapReduceSummarizer, prompt_budget
+from metrics import STAGE_SECONDS, stage
+from retriever import DocumentIndex
+
+def page_spans(text: str, pages: List[str], chunks: List[str]) -> List[Tuple[int, int]]:
+    """
+    (first page, last page) of each chunk of `text`, the pages joined with
+    a newline after each. Chunks are found in order; overlapping ones may
+    start before the previous one ends.
+    """
+    starts = []
+    offset = 0
+    for page in pages:
+        starts.append(offset)
+        offset += len(page) + 1
+    spans = []
+    search_from = 0
+    for chunk in chunks:
+        start = text.find(chunk, search_from)
+        if start < 0:
+            start = search_from
+        spans.append((bisect_right(starts, start), bisect_right(starts, start + max(len(chunk), 1) - 1)))
+        search_from = start + 1
+    return spans
 
 class PDFSummarizer:
-    def __init__(self, model_name="llama3.2:3b"):
-        self.llm = Ollama(model=model_name)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=4000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", " ", ""]
+    def __init__(self, model_name="llama3.2:3b", embedder=None, map_memo=None):
+        self.llm = create_llm(model_name)
+        # Summarization chunks, and the batches of summaries combined on
+        # reduce, fill the same share of the model's context
+        self.token_counter = get_token_counter()
+        self.chunk_tokens = prompt_budget(self.llm.context_tokens, self.token_counter)
+        # Map results are memoized per chunk when a store (the database) is given
+        self.map_reduce = MapReduceSummarizer(
+            self.llm, context_tokens=self.chunk_tokens, memo=map_memo,
+            model=f"{self.llm.backend}:{model_name}", counter=self.token_counter
         )
+        self._retrieval_splitter = None
+        # Optional embedding model; without one retrieval falls back to BM25
+        if embedder is None and os.getenv("EMBEDDING_MODEL"):
+            from langchain.embeddings import OllamaEmbeddings
+            embedder = OllamaEmbeddings(model=os.getenv("EMBEDDING_MODEL"))
+        self.embedder = embedder
+        self.top_k = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+        self.context_token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
     
-    def extract_text_from_pdf(self, pdf_content: bytes) -> str:
-        """Extract text from PDF content"""
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+    @property
+    def retrieval_splitter(self):
+        """Splitter for retrieval chunks; LangChain is only imported once one is needed"""
+        if self._retrieval_splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            # Smaller chunks for retrieval so several can fit in the chat prompt
+            self._retrieval_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=int(os.getenv("RETRIEVAL_CHUNK_SIZE", "1000")),
+                chunk_overlap=int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "100")),
+                separators=["\n\n", "\n", " ", ""]
+            )
+        return self._retrieval_splitter
     
-    def split_text(self, text: str) -> List[Document]:
-        """Split text into manageable chunks"""
-        texts = self.text_splitter.split_text(text)
-        return [Document(page_content=t) for t in texts]
+    def warm_up(self):
+        """
+        Load what the first upload and chat would otherwise wait for: the
+        LangChain and PDF modules, then the model itself
+        """
+        import PyPDF2  # noqa: F401
+        self.retrieval_splitter
+        self.llm.warm_up()
     
-    def summarize(self, pdf_content: bytes) -> str:
-        """Generate a summary from PDF content"""
-        # Extract text from PDF
-        text = self.extract_text_from_pdf(pdf_content)
-        
-        # Split text into chunks
-        docs = self.split_text(text)
-        
-        # Load summarize chain
-        chain = load_summarize_chain(self.llm, chain_type="map_reduce")
-        
-        # Generate summary
-        summary = chain.run(docs)
-        
-        return summary
+    def iter_chunks(self, pages: Iterable[Tuple[int, str]]) -> Iterator[Chunk]:
+        """
+        Split (page number, text) pairs into summarization chunks of at
+        most `chunk_tokens` tokens as they arrive. Chunks are packed from
+        whole pages (a page longer than a chunk is split on its own at
+        paragraph breaks), so editing a page only changes the chunks that
+        hold it and the rest reuse their memoized map results.
+        Each chunk records the first and last page it covers.
+        """
+        chunker = PageChunker(self.chunk_tokens, self.token_counter)
+        yield from chunker.chunks(pages)
+        STAGE_SECONDS.observe(chunker.seconds, stage="split")
     
-    def chat(self, query: str, context: str, chat_history: List[Dict[str, Any]]) -> str:
-        """Generate a response to a query based on context and chat history"""
+    def build_index(self, text: str, pages: Optional[List[str]] = None) -> DocumentIndex:
+        """
+        Split text into retrieval chunks and index them. With the `pages`
+        that `text` was joined from, each chunk records its page span.
+        """
+        with stage("index"):
+            chunks = self.retrieval_splitter.split_text(text)
+            spans = page_spans(text, pages, chunks) if pages is not None else None
+            return DocumentIndex(chunks, embedder=self.embedder, pages=spans)
+    
+    def load_index(self, index_data: Dict[str, Any]) -> DocumentIndex:
+        """Rebuild a retrieval index from its stored form"""
+        return DocumentIndex.from_dict(index_data, embedder=self.embedder)
+    
+    def retrieve_context(self, query: str, index: DocumentIndex) -> str:
+        """Select the chunks most relevant to the query within the token budget"""
+        with stage("retrieve"):
+            chunks = index.retrieve(query, top_k=self.top_k, token_budget=self.context_token_budget)
+        return "\n\n".join(chunks)
+    
+    def summarize_pages(self, pages: Iterable[Tuple[int, str]], on_progress: Optional[Callable] = None) -> str:
+        """Generate a summary while pages are still being extracted"""
+        chunks = (chunk.text for chunk in self.iter_chunks(pages))
+        return self.map_reduce.summarize(chunks, on_progress)
+    
+    def build_chat_prompt(self, query: str, context: str, chat_history: List[Dict[str, Any]],
+                          conversation_summary: str = "") -> str:
+        """Build the chat prompt from context, a summary of earlier turns and recent chat history"""
         # Format chat history
         formatted_history = ""
         for msg in chat_history:
             formatted_history += f"{msg['role']}: {msg['content']}\n"
         
+        earlier = ""
+        if conversation_summary:
+            earlier = f"""
+        EARLIER CONVERSATION (SUMMARY):
+        {conversation_summary}
+        """
+        
         # Create prompt
-        prompt = f"""
+        return f"""
         You are a helpful assistant that answers questions about PDF documents.
         
         CONTEXT:
         {context}
-        
+        {earlier}
         CHAT HISTORY:
         {formatted_history}
         
@@ -66,8 +140,19 @@ class PDFSummarizer:
         
         Please provide a helpful, accurate, and concise response based on the context provided.
         """
+    
+    def chat(self, query: str, context: str, chat_history: List[Dict[str, Any]],
+             conversation_summary: str = "") -> str:
+        """Generate a response to a query based on context and chat history"""
+        prompt = self.build_chat_prompt(query, context, chat_history, conversation_summary)
         
         # Generate response
         response = self.llm.invoke(prompt)
         
-        return response 
\ No newline at end of file
+        return response
+    
+    def chat_stream(self, query: str, context: str, chat_history: List[Dict[str, Any]],
+                    conversation_summary: str = "") -> Iterator[str]:
+        """Generate a response token by token"""
+        prompt = self.build_chat_prompt(query, context, chat_history, conversation_summary)
+        return self.llm.stream(prompt)
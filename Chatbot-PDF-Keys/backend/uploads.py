@@ -0,0 +1,105 @@
+import hashlib
+import os
+import tempfile
+import zipfile
+from typing import List, Tuple
+
+from fastapi import UploadFile
+
+from executor import run_blocking
+
+# Uploads are copied to disk in pieces of this size, so memory per upload
+# stays bounded whatever the file size
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024
+SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or tempfile.gettempdir()
+
+# Limits for /summarize/batch: the whole request body, files per batch, and
+# the spooled PDFs in total once zip archives are decompressed
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_BATCH_UPLOAD_MB", "2000")) * 1024 * 1024
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "500"))
+MAX_BATCH_EXTRACTED_BYTES = int(os.getenv("MAX_BATCH_EXTRACTED_MB", "4000")) * 1024 * 1024
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_MB"""
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[str, str]:
+    """
+    Stream an upload into a spool file, hashing it on the way.
+    Returns (path, sha256 hex digest); the caller must delete the file.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+                digest.update(chunk)
+                await run_blocking(spool.write, chunk)
+    except BaseException:
+        remove_spool(path)
+        raise
+    return path, digest.hexdigest()
+
+def spool_zip(path: str, max_bytes: int = MAX_UPLOAD_BYTES,
+              max_total_bytes: int = MAX_BATCH_EXTRACTED_BYTES) -> List[Tuple[str, str]]:
+    """
+    Copy every PDF in a zip archive to its own spool file.
+    Returns (file name, path) pairs; the caller must delete the files.
+    Members are size-checked while decompressing, not from their headers:
+    each against `max_bytes`, and all of them together against
+    `max_total_bytes`, so a highly compressed archive cannot fill the disk.
+    """
+    spooled = []
+    total = 0
+    try:
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.infolist():
+                name = os.path.basename(member.filename)
+                if member.is_dir() or not name.lower().endswith(".pdf") or member.filename.startswith("__MACOSX/"):
+                    continue
+                if len(spooled) >= MAX_BATCH_FILES:
+                    raise UploadTooLargeError(f"Archive has more than {MAX_BATCH_FILES} PDFs")
+                fd, spool_path = tempfile.mkstemp(suffix=".pdf", dir=SPOOL_DIR)
+                spooled.append((name, spool_path))
+                size = 0
+                with archive.open(member) as source, os.fdopen(fd, "wb") as spool:
+                    while True:
+                        chunk = source.read(UPLOAD_CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        total += len(chunk)
+                        if size > max_bytes:
+                            raise UploadTooLargeError(f"{name} exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+                        if total > max_total_bytes:
+                            raise UploadTooLargeError(
+                                f"Extracted PDFs exceed the {MAX_BATCH_EXTRACTED_BYTES // (1024 * 1024)} MB batch limit"
+                            )
+                        spool.write(chunk)
+    except BaseException:
+        for _, spool_path in spooled:
+            remove_spool(spool_path)
+        raise
+    return spooled
+
+def hash_file(path: str) -> str:
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def remove_spool(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,193 @@
+"""
+End-to-end latency and throughput of the FastAPI backend.
+
+Drives /summarize (+ /jobs polling), /chat, /sessions and /history
+in-process through the ASGI app with the fake LLM backend and synthetic
+PDFs, from N concurrent clients. Reports p50/p95/p99 latency, throughput
+and peak RSS per scenario as JSON; with --baseline, compares p95 and
+throughput against a previous run and exits non-zero on a regression.
+
+Usage: python benchmarks/bench_api.py [--clients 8] [--pages 10 50 200]
+       [--output result.json] [--baseline benchmarks/baseline_api.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from pdfgen import make_pdf
+
+API_KEY = "bench"
+HEADERS = {"X-API-Key": API_KEY}
+
+def configure(llm_latency: float, workdir: str):
+    """Environment for an isolated run; must happen before the backend is imported"""
+    os.environ["API_KEY"] = API_KEY
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(llm_latency)
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["UPLOAD_SPOOL_DIR"] = workdir
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def unique_document(page_count: int, tag: str) -> bytes:
+    """Distinct content per upload so the document cache does not short-circuit it"""
+    return make_pdf([
+        "\n".join(
+            f"Document {tag} page {p} line {l}: deadline {p}.{l} for clause {l} of section {p}"
+            for l in range(30)
+        )
+        for p in range(1, page_count + 1)
+    ])
+
+async def run_clients(clients: int, requests: int, call: Callable[[int], Awaitable[None]]) -> Dict[str, Any]:
+    """Run `requests` calls spread over `clients` concurrent workers and summarize their latency"""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await call(i)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors += 1
+                print(f"request {i} failed: {e}", file=sys.stderr)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": errors,
+        "clients": clients,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+async def summarize(client, content: bytes, name: str) -> str:
+    """Upload a PDF and wait for its job; returns the new session id"""
+    while True:
+        response = await client.post("/summarize", files={"file": (name, content, "application/pdf")}, headers=HEADERS)
+        if response.status_code != 429:
+            break
+        await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+    response.raise_for_status()
+    job = response.json()
+    while job["status"] in ("queued", "running"):
+        await asyncio.sleep(0.05)
+        job = (await client.get(f"/jobs/{job['job_id']}", headers=HEADERS)).json()
+    if job["status"] != "done":
+        raise RuntimeError(job["error"])
+    return job["session_id"]
+
+async def run(args) -> Dict[str, Any]:
+    import httpx
+    import main as backend
+
+    transport = httpx.ASGITransport(app=backend.app)
+    results: Dict[str, Any] = {"config": vars(args).copy(), "scenarios": {}}
+    results["config"].pop("baseline", None)
+    results["config"].pop("output", None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        session_ids: List[str] = []
+
+        for page_count in args.pages:
+            documents = [unique_document(page_count, f"{page_count}-{i}") for i in range(args.uploads)]
+
+            async def upload(i: int):
+                session_ids.append(await summarize(client, documents[i], f"bench-{page_count}-{i}.pdf"))
+
+            results["scenarios"][f"summarize_{page_count}p"] = await run_clients(args.clients, args.uploads, upload)
+
+        async def chat(i: int):
+            response = await client.post("/chat", headers=HEADERS, json={
+                "session_id": session_ids[i % len(session_ids)],
+                "message": f"What is the deadline for clause {i}?",
+                "use_cache": False,
+            })
+            response.raise_for_status()
+
+        async def sessions(i: int):
+            response = await client.get("/sessions", params={"limit": 20}, headers=HEADERS)
+            response.raise_for_status()
+
+        async def history(i: int):
+            response = await client.get(f"/history/{session_ids[i % len(session_ids)]}", headers=HEADERS)
+            response.raise_for_status()
+
+        results["scenarios"]["chat"] = await run_clients(args.clients, args.requests, chat)
+        results["scenarios"]["sessions"] = await run_clients(args.clients, args.requests, sessions)
+        results["scenarios"]["history"] = await run_clients(args.clients, args.requests, history)
+    return results
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Scenarios whose p95 grew or throughput fell by more than `tolerance`"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        p95_ratio = current["p95_ms"] / previous["p95_ms"] if previous["p95_ms"] else 1.0
+        rps_ratio = current["throughput_rps"] / previous["throughput_rps"] if previous["throughput_rps"] else 1.0
+        current["vs_baseline"] = {"p95": round(p95_ratio, 2), "throughput": round(rps_ratio, 2)}
+        if p95_ratio > 1 + tolerance or rps_ratio < 1 - tolerance:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--uploads", type=int, default=8, help="uploads per document size")
+    parser.add_argument("--requests", type=int, default=200, help="requests per chat/sessions/history scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--output", help="write the JSON results here as well as to stdout")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure(args.llm_latency, workdir)
+        results = asyncio.run(run(args))
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["regressions"] = regressions
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if regressions:
+        sys.exit(f"Regressed against baseline: {', '.join(regressions)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compare PDF text extraction paths on synthetic 10/100/1000-page PDFs.
+
+- legacy: the original `text += page.extract_text()` loop
+- stream: extraction.PageStream parsing sequentially
+- parallel: extraction.PageStream fanning page ranges across a process pool
+
+Usage: python benchmarks/bench_extraction.py [--pages 10 100 1000] [--workers 4]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+import PyPDF2
+
+import extraction
+from extraction import PageStream
+from pdfgen import make_document
+
+def legacy(content: bytes) -> str:
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+    text = ""
+    for page in pdf_reader.pages:
+        text += page.extract_text() + "\n"
+    return text
+
+def stream(content: bytes, pool=None, workers=None) -> str:
+    pages = PageStream(content, pool=pool, workers=workers)
+    for _ in pages:
+        pass
+    return pages.text
+
+def timed(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return round(time.perf_counter() - start, 3)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # Always take the parallel path in this benchmark, whatever the page count
+    extraction.PARALLEL_PAGE_THRESHOLD = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        pool.submit(int).result()  # start the workers before timing
+        for page_count in args.pages:
+            content = make_document(page_count)
+            assert legacy(content) == stream(content)
+            print({
+                "pages": page_count,
+                "legacy_s": timed(legacy, content),
+                "stream_s": timed(stream, content),
+                "parallel_s": timed(stream, content, pool, args.workers),
+            })
+
+if __name__ == "__main__":
+    main()
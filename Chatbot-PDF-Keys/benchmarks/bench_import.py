@@ -0,0 +1,87 @@
+"""
+Cold-start cost of the FastAPI backend.
+
+Imports backend/main.py in fresh interpreters and reports the median import
+time and the first /healthz response time. Fails if a module that should
+load lazily (LangChain, PyPDF2, httpx, the summarizer) is imported eagerly,
+or, with --baseline, if the import got slower than the previous run by
+more than --tolerance.
+
+Usage: python benchmarks/bench_import.py [--runs 5] [--output result.json]
+       [--baseline previous.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+# Modules only the first upload or chat should pay for
+LAZY_MODULES = ["langchain", "langchain_core", "langchain_text_splitters", "PyPDF2", "httpx", "summarizer"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+import asyncio
+response = asyncio.run(main.healthz())
+healthy = time.perf_counter() - started
+print(json.dumps({
+    "import_seconds": imported,
+    "healthz_seconds": healthy,
+    "status": response["status"],
+    "eager": [name for name in %r if name in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+def probe(workdir: str) -> dict:
+    env = dict(os.environ, API_KEY="bench", DATABASE_PATH=os.path.join(workdir, "bench.db"), WARMUP="false")
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=BACKEND, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON results here as well as to stdout")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        probe(workdir)  # the first run creates the database and warms the OS file cache
+        runs = [probe(workdir) for _ in range(args.runs)]
+
+    results = {
+        "runs": args.runs,
+        "import_ms": round(statistics.median(run["import_seconds"] for run in runs) * 1000, 1),
+        "healthz_ms": round(statistics.median(run["healthz_seconds"] for run in runs) * 1000, 1),
+        "eager_modules": sorted({name for run in runs for name in run["eager"]}),
+    }
+    failures = []
+    if results["eager_modules"]:
+        failures.append(f"imported eagerly: {', '.join(results['eager_modules'])}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            previous = json.load(f)
+        ratio = results["import_ms"] / previous["import_ms"] if previous.get("import_ms") else 1.0
+        results["vs_baseline"] = round(ratio, 2)
+        if ratio > 1 + args.tolerance:
+            failures.append(f"import time {results['import_ms']} ms vs {previous['import_ms']} ms baseline")
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if failures:
+        sys.exit("Cold start regressed: " + "; ".join(failures))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Measure GET /search query latency over a large message history.
+
+Fills a fresh database with synthetic sessions and messages (indexed by the
+same triggers as live traffic) and times ChatDatabase.search for common,
+rare, multi-term and paginated queries.
+
+Usage: python benchmarks/bench_search.py [--messages 1000000] [--queries 50]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from db import ChatDatabase
+
+WORDS = (
+    "contract invoice payment deadline clause section party agreement notice term renewal "
+    "liability warranty delivery schedule amount penalty interest report summary page table "
+    "figure appendix revision approval signature budget quarter annual review audit compliance"
+).split()
+
+def fill(db: ChatDatabase, messages: int, sessions: int, batch: int = 10000):
+    rng = random.Random(0)
+    session_ids = [str(uuid.uuid4()) for _ in range(sessions)]
+    conn = db._connection()
+    with conn:
+        conn.executemany(
+            "INSERT INTO sessions (session_id, pdf_name) VALUES (?, ?)",
+            [(session_id, f"doc-{i}.pdf") for i, session_id in enumerate(session_ids)]
+        )
+    for start in range(0, messages, batch):
+        rows = []
+        for i in range(start, min(start + batch, messages)):
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40)))
+            if i % 10000 == 0:
+                text += " zanzibar"  # rare term
+            rows.append((session_ids[i % sessions], "user" if i % 2 == 0 else "assistant", text))
+        with conn:
+            conn.executemany("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)", rows)
+    return session_ids
+
+def timed(call, repeat: int) -> dict:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=50, help="repetitions per query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db = ChatDatabase(os.path.join(workdir, "search.db"))
+        start = time.perf_counter()
+        session_ids = fill(db, args.messages, args.sessions)
+        print(f"Indexed {args.messages} messages in {time.perf_counter() - start:.1f}s")
+
+        _, cursor = db.search("invoice deadline", limit=20)
+        cases = {
+            "rare term": lambda: db.search("zanzibar", limit=20),
+            "common term": lambda: db.search("invoice", limit=20),
+            "two terms": lambda: db.search("invoice deadline", limit=20),
+            "phrase": lambda: db.search("payment.deadline", limit=20),
+            "next page": lambda: db.search("invoice deadline", limit=20, after=cursor),
+            "one session": lambda: db.search("invoice", session_id=session_ids[0], limit=20),
+        }
+        for name, call in cases.items():
+            print(f"{name:<12} {timed(call, args.queries)}")
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Measure the map_reduce summarization speedup from concurrent map calls.
+
+Runs MapReduceSummarizer against a fake LLM that sleeps for a fixed latency
+and records the start/end time of every call.
+
+Usage: python benchmarks/bench_summarize.py [--chunks 100] [--latency 0.05]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from map_reduce import MapReduceSummarizer
+
+class TimingFakeLLM:
+    """Fake LLM that simulates a fixed generation latency and records call timing"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt: str) -> str:
+        start = time.perf_counter()
+        time.sleep(self.latency)
+        end = time.perf_counter()
+        with self._lock:
+            self.calls.append((start, end))
+        return "summary " + str(len(prompt))
+
+    def max_concurrency(self) -> int:
+        events = sorted([(s, 1) for s, _ in self.calls] + [(e, -1) for _, e in self.calls])
+        running = peak = 0
+        for _, delta in events:
+            running += delta
+            peak = max(peak, running)
+        return peak
+
+def run(chunks: int, latency: float, workers: int) -> dict:
+    llm = TimingFakeLLM(latency)
+    engine = MapReduceSummarizer(llm, max_workers=workers, context_tokens=3000)
+    texts = [f"chunk {i} " + "lorem ipsum " * 300 for i in range(chunks)]
+    start = time.perf_counter()
+    engine.summarize(texts)
+    elapsed = time.perf_counter() - start
+    return {
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "llm_calls": len(llm.calls),
+        "peak_concurrency": llm.max_concurrency(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in args.workers:
+        result = run(args.chunks, args.latency, workers)
+        baseline = baseline or result["seconds"]
+        result["speedup"] = round(baseline / result["seconds"], 2)
+        print(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Synthetic text PDFs for benchmarks (no PDF library needed)"""
+from typing import List
+
+def make_pdf(pages: List[str]) -> bytes:
+    """Build a minimal PDF with one Helvetica text page per string (lines split on newlines)"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    font_id = 3 + 2 * len(pages)
+    for i, text in enumerate(pages):
+        lines = " ".join(f"({line}) Tj 0 -12 Td" for line in text.split("\n"))
+        stream = f"BT /F1 10 Tf 20 800 Td {lines} ET".encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    return out
+
+def make_document(page_count: int, lines_per_page: int = 40) -> bytes:
+    """A PDF of `page_count` pages of filler text"""
+    pages = [
+        "\n".join(
+            f"Page {p} line {l}: the quick brown fox jumps over the lazy dog clause {p}.{l}"
+            for l in range(lines_per_page)
+        )
+        for p in range(1, page_count + 1)
+    ]
+    return make_pdf(pages)
@@ -2,7 +2,7 @@ import streamlit as st
 import time
 import os
 from dotenv import load_dotenv
-from ui_helpers import upload_pdf, send_message, get_chat_history, get_all_sessions, display_message, reload_session
+from ui_helpers import upload_pdf, send_message_stream, get_chat_history, get_all_sessions, has_more_sessions, load_more_sessions, display_message, stream_message, reload_session
 
 # Load environment variables
 load_dotenv()
@@ -34,10 +34,18 @@ with st.sidebar:
     uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
     
     if uploaded_file is not None:
+        # A chat can hold several PDFs, e.g. to compare them
+        add_to_chat = st.session_state.session_id is not None and st.checkbox("Add to the current chat")
         if st.button("Process PDF"):
-            result = upload_pdf(uploaded_file)
-            if result:
+            result = upload_pdf(uploaded_file, st.session_state.session_id if add_to_chat else None)
+            if result and add_to_chat:
+                st.success(f"Added {uploaded_file.name} to the chat")
+                st.session_state.messages.append(
+                    {"role": "assistant", "content": f"PDF Summary ({uploaded_file.name}): {result['summary']}"}
+                )
+            elif result:
                 st.success(f"PDF processed successfully!")
+                st.session_state.session_id = result["session_id"]
                 st.session_state.messages = []  # Clear messages for new PDF
                 
                 # Add summary as first message
@@ -48,8 +56,9 @@ with st.sidebar:
     # Session management
     st.header("Previous Sessions")
     
-    # Get sessions (will use cache if available)
-    sessions = get_all_sessions()
+    # Get sessions page by page (will use cache if available)
+    search = st.text_input("Search by PDF name", key="session_search")
+    sessions = get_all_sessions(search)
     
     if sessions:
         selected_session = st.selectbox(
@@ -71,6 +80,11 @@ with st.sidebar:
                 st.session_state.messages = history
                 st.success(f"Loaded session: {sessions[selected_idx]['pdf_name']}")
                 st.rerun()
+    
+    # Older sessions are only fetched on demand
+    if has_more_sessions() and st.button("Load more sessions"):
+        load_more_sessions()
+        st.rerun()
 
 # Main chat interface
 st.subheader("Chat")
@@ -85,9 +99,10 @@ user_input = st.chat_input("Type your message here...")
 if user_input:
     # Add user message to chat
     st.session_state.messages.append({"role": "user", "content": user_input})
+    display_message("user", user_input)
     
-    # Get AI response
-    response = send_message(user_input)
+    # Get AI response, rendering tokens as they arrive
+    response = stream_message(send_message_stream(user_input))
     
     if response:
         # Add AI response to chat
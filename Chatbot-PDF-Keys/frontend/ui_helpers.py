@@ -3,7 +3,7 @@ import requests
 import json
 import os
 import time
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,55 +18,133 @@ if not API_KEY:
 # Headers for API requests
 HEADERS = {"X-API-Key": API_KEY}
 
-# Cache timeout in seconds
-CACHE_TIMEOUT = 5  # 5 seconds
+# Number of sessions fetched per page for the sidebar
+SESSIONS_PAGE_SIZE = 20
 
-def upload_pdf(file) -> Dict[str, Any]:
-    """Upload and summarize a PDF file"""
+# Seconds between job status polls while a PDF is being summarized
+JOB_POLL_INTERVAL = 1
+
+def upload_pdf(file, session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Upload a PDF file and wait for its summary, showing progress.
+    With a session_id the PDF is added to that chat instead of starting a new one.
+    """
     files = {"file": file}
+    data = {"session_id": session_id} if session_id else None
     
     response = requests.post(
         f"{API_URL}/summarize",
         files=files,
+        data=data,
         headers=HEADERS
     )
     
-    if response.status_code == 200:
-        return response.json()
-    elif response.status_code in [401, 403]:
+    if response.status_code in [401, 403]:
         st.error("Authentication failed. Invalid API key.")
         return None
-    else:
+    elif response.status_code == 429:
+        st.error("The server is busy processing other PDFs. Please try again in a moment.")
+        return None
+    elif response.status_code != 200:
         st.error(f"Error processing PDF: {response.text}")
         return None
+    
+    job = response.json()
+    progress_bar = st.progress(0, text="Queued...")
+    
+    while job["status"] in ["queued", "running"]:
+        time.sleep(JOB_POLL_INTERVAL)
+        response = requests.get(
+            f"{API_URL}/jobs/{job['job_id']}",
+            headers=HEADERS
+        )
+        if response.status_code != 200:
+            progress_bar.empty()
+            st.error(f"Error checking PDF progress: {response.text}")
+            return None
+        job = response.json()
+        progress_bar.progress(*_job_progress(job))
+    
+    progress_bar.empty()
+    
+    if job["status"] == "failed":
+        st.error(f"Error processing PDF: {job['error']}")
+        return None
+    
+    # A session was created; refetch the sidebar list instead of extending it
+    st.session_state.pop("sessions_list", None)
+    
+    return job["result"]
+
+def _job_progress(job: Dict[str, Any]):
+    """Progress bar fraction and label for a job status"""
+    done = job["progress"]["done"]
+    total = job["progress"]["total"]
+    stage = job["stage"]
+    
+    if stage == "mapping" and total:
+        # Mapping chunks is the bulk of the work
+        value = 0.1 + 0.7 * done / total
+        text = f"Summarizing chunk {done} of {total}"
+    elif stage == "reducing":
+        value = 0.85
+        text = "Combining partial summaries"
+    elif stage == "indexing":
+        value = 0.95
+        text = "Indexing document"
+    elif stage == "extracting":
+        value = 0.05
+        text = "Extracting text"
+    else:
+        value = 0.0
+        text = "Queued..."
+    
+    if job.get("eta_seconds") is not None:
+        text += f" (about {int(job['eta_seconds'])}s left)"
+    
+    return min(value, 1.0), text
 
-def send_message(message: str) -> Optional[str]:
-    """Send a message to the chatbot and get a response"""
+def send_message_stream(message: str) -> Iterator[str]:
+    """Send a message to the chatbot and yield the response tokens as they arrive"""
     session_id = st.session_state.session_id
     
     if not session_id:
         st.error("No active session. Please upload a PDF first.")
-        return None
+        return
     
     data = {
         "session_id": session_id,
         "message": message
     }
     
-    response = requests.post(
-        f"{API_URL}/chat",
+    with requests.post(
+        f"{API_URL}/chat/stream",
         json=data,
-        headers=HEADERS
-    )
-    
-    if response.status_code == 200:
-        return response.json()["response"]
-    elif response.status_code in [401, 403]:
-        st.error("Authentication failed. Invalid API key.")
-        return None
-    else:
-        st.error(f"Error sending message: {response.text}")
-        return None
+        headers=HEADERS,
+        stream=True
+    ) as response:
+        if response.status_code in [401, 403]:
+            st.error("Authentication failed. Invalid API key.")
+            return
+        elif response.status_code != 200:
+            st.error(f"Error sending message: {response.text}")
+            return
+        
+        # Server-Sent Events: optional "event:" line, then a "data:" line
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                event = None
+            elif line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                payload = json.loads(line[len("data:"):])
+                if event == "error":
+                    st.error(f"Error generating response: {payload['detail']}")
+                    return
+                elif event == "done":
+                    return
+                yield payload["token"]
 
 def get_chat_history(session_id: str) -> List[Dict[str, Any]]:
     """Get chat history for a session"""
@@ -84,55 +162,116 @@ def get_chat_history(session_id: str) -> List[Dict[str, Any]]:
         st.error(f"Error fetching chat history: {response.text}")
         return []
 
-def get_all_sessions() -> List[Dict[str, Any]]:
-    """Get all chat sessions with caching to reduce API calls"""
-    # Initialize cache in session state if not already present
-    if "sessions_cache" not in st.session_state:
-        st.session_state.sessions_cache = None
+def _get_with_etag(url: str, params: Dict[str, Any]) -> Any:
+    """
+    GET that revalidates with If-None-Match; a 304 reuses the cached body.
+    Returns the decoded JSON on success, otherwise the failed response.
+    """
+    if "etag_cache" not in st.session_state:
+        st.session_state.etag_cache = {}
     
-    if "last_sessions_fetch" not in st.session_state:
-        st.session_state.last_sessions_fetch = 0
+    key = (url, tuple(sorted(params.items())))
+    cached = st.session_state.etag_cache.get(key)
+    headers = dict(HEADERS)
+    if cached:
+        headers["If-None-Match"] = cached[0]
     
-    current_time = time.time()
-    
-    # Use cached data if available and not expired
-    if (st.session_state.sessions_cache is not None and 
-        current_time - st.session_state.last_sessions_fetch < CACHE_TIMEOUT):
-        return st.session_state.sessions_cache
-    
-    # Otherwise, fetch new data
-    response = requests.get(
-        f"{API_URL}/sessions",
-        headers=HEADERS
-    )
+    response = requests.get(url, params=params, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached[1]
+    if response.status_code == 200 and "ETag" in response.headers:
+        st.session_state.etag_cache[key] = (response.headers["ETag"], response.json())
+    return response.json() if response.status_code == 200 else response
+
+def _fetch_sessions_page(search: str, after: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    params = {"limit": SESSIONS_PAGE_SIZE}
+    if search:
+        params["search"] = search
+    if after:
+        params["after"] = after
     
-    if response.status_code == 200:
-        sessions = response.json()["sessions"]
-        # Update cache
-        st.session_state.sessions_cache = sessions
-        st.session_state.last_sessions_fetch = current_time
-        return sessions
-    elif response.status_code in [401, 403]:
+    result = _get_with_etag(f"{API_URL}/sessions", params)
+    if isinstance(result, dict):
+        return result
+    elif result.status_code in [401, 403]:
         st.error("Authentication failed. Invalid API key.")
-        return []
     else:
-        st.error(f"Error fetching sessions: {response.text}")
-        return []
+        st.error(f"Error fetching sessions: {result.text}")
+    return None
 
-def display_message(role: str, content: str):
-    """Display a chat message with appropriate styling"""
+def get_all_sessions(search: str = "") -> List[Dict[str, Any]]:
+    """
+    Get the sessions loaded so far for the sidebar, newest first.
+    Only the first page is fetched up front and it is revalidated with its
+    ETag on every rerun, so sessions created elsewhere show up at once while
+    an unchanged list costs a 304; load_more_sessions fetches the rest.
+    """
+    state = st.session_state.get("sessions_list")
+    
+    page = _fetch_sessions_page(search)
+    if page is None:
+        return state["sessions"] if state else []
+    
+    if state is not None and state["search"] == search and state["first_page"] == page["sessions"]:
+        # Nothing new; keep any extra pages already loaded
+        return state["sessions"]
+    
+    st.session_state.sessions_list = {
+        "search": search,
+        "sessions": list(page["sessions"]),
+        "first_page": page["sessions"],
+        "next_cursor": page["next_cursor"]
+    }
+    return st.session_state.sessions_list["sessions"]
+
+def has_more_sessions() -> bool:
+    state = st.session_state.get("sessions_list")
+    return bool(state and state["next_cursor"])
+
+def load_more_sessions():
+    """Append the next page of sessions to the sidebar list"""
+    state = st.session_state.get("sessions_list")
+    if not state or not state["next_cursor"]:
+        return
+    
+    page = _fetch_sessions_page(state["search"], state["next_cursor"])
+    if page is not None:
+        state["sessions"].extend(page["sessions"])
+        state["next_cursor"] = page["next_cursor"]
+
+def _message_html(role: str, content: str) -> str:
+    """HTML for a chat message with appropriate styling"""
     if role == "user":
-        st.markdown("""
+        return """
         <div style="border: 1px solid #2e86de; border-radius: 10px; padding: 10px; margin-bottom: 10px; background-color: #f1f8ff; color: #000000;">
             <p><strong>👤 You:</strong> {}</p>
         </div>
-        """.format(content), unsafe_allow_html=True)
+        """.format(content)
     else:
-        st.markdown("""
+        return """
         <div style="border: 1px solid #10ac84; border-radius: 10px; padding: 10px; margin-bottom: 10px; background-color: #e8f5e9; color: #000000;">
             <p><strong>🤖 Assistant:</strong> {}</p>
         </div>
-        """.format(content), unsafe_allow_html=True)
+        """.format(content)
+
+def display_message(role: str, content: str):
+    """Display a chat message with appropriate styling"""
+    st.markdown(_message_html(role, content), unsafe_allow_html=True)
+
+def stream_message(tokens: Iterator[str]) -> Optional[str]:
+    """Render an assistant message as its tokens arrive and return the full text"""
+    placeholder = st.empty()
+    content = ""
+    for token in tokens:
+        content += token
+        placeholder.markdown(_message_html("assistant", content + "▌"), unsafe_allow_html=True)
+    
+    if not content:
+        placeholder.empty()
+        return None
+    
+    placeholder.markdown(_message_html("assistant", content), unsafe_allow_html=True)
+    return content
 
 def reload_session(session_id: str) -> bool:
     """Reload a session's PDF data into memory on the backend"""